@@ -0,0 +1,97 @@
+"""A bounded least-recently-used cache with hit and miss counters."""
+
+from collections import OrderedDict
+
+
+class LruCache:
+    """A mapping that evicts the least recently used entries.
+
+    The number of hits, misses and evictions is counted,
+    see :meth:`info`.
+    """
+
+    def __init__(self, maxsize=128):
+        """Initialize the cache.
+
+        Args:
+            maxsize (int): The maximum number of entries. None means
+                unbounded, 0 disables the cache.
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        """Check whether the given key is cached. Does not count as a hit."""
+        return key in self._data
+
+    def __len__(self):
+        """Get the number of cached entries."""
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Get the value for the given key and mark it as recently used.
+
+        Args:
+            key (Hashable): The key to look up.
+            default (Any): Returned if the key is not cached.
+
+        Returns:
+            Any: The cached value or the default.
+        """
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Cache the value for the given key.
+
+        Args:
+            key (Hashable): The key to store the value for.
+            value (Any): The value to cache.
+        """
+        if self.maxsize == 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while self.maxsize is not None and len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Remove the given key from the cache.
+
+        Args:
+            key (Hashable): The key to remove.
+            default (Any): Returned if the key is not cached.
+
+        Returns:
+            Any: The removed value or the default.
+        """
+        return self._data.pop(key, default)
+
+    def clear(self):
+        """Remove all entries. The counters are kept."""
+        self._data.clear()
+
+    def info(self):
+        """Get the statistics of the cache.
+
+        Returns:
+            Dict[str, int]: The number of hits, misses and evictions,
+                the current size and the maximum size of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize
+        }
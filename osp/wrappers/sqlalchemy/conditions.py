@@ -0,0 +1,260 @@
+"""Conditions in addition to the ones of osp-core.
+
+The conditions of osp-core are validated and expanded by SqlQuery.where,
+which only knows about the conditions of osp-core. Use :func:`where` to add
+the conditions of this module to a query.
+"""
+
+from copy import deepcopy
+import rdflib
+from osp.core.ontology.datatypes import convert_from
+from osp.core.session.db.sql_util import AndCondition, Condition, \
+    EqualsCondition, VEC_PREFIX, check_characters, expand_vector_condition
+
+
+class InCondition(EqualsCondition):
+    """An SQL IN condition.
+
+    Subclass of EqualsCondition, such that the checks of osp-core accept
+    it. Vectors are not supported.
+    """
+
+    def __init__(self, table_name, column, values, datatype):
+        """Initialize the condition.
+
+        Args:
+            table_name (str): The name of the table.
+            column (str): The column object.
+            values (Iterable[Any]): The allowed values for that column.
+            datatype (str): The datatype of the column.
+
+        Raises:
+            ValueError: The datatype is a vector.
+        """
+        _check_no_vector(self, datatype)
+        self.table_name = table_name
+        self.column = column
+        self.values = tuple(convert_from(v, datatype) for v in values)
+        self.datatype = datatype
+
+    @property
+    def value(self):
+        """Return the allowed values."""
+        return self.values
+
+
+class ComparisonCondition(EqualsCondition):
+    """An SQL condition comparing a column to a value, e.g. column < value.
+
+    Vectors are not supported.
+    """
+
+    OPERATORS = ("<", "<=", ">", ">=", "!=")
+
+    def __init__(self, table_name, column, operator, value, datatype):
+        """Initialize the condition.
+
+        Args:
+            table_name (str): The name of the table.
+            column (str): The column object.
+            operator (str): One of <, <=, >, >= and !=.
+            value (Any): The value to compare to.
+            datatype (str): The datatype of the column.
+
+        Raises:
+            ValueError: Unknown operator or the datatype is a vector.
+        """
+        if operator not in self.OPERATORS:
+            raise ValueError(f"Unknown operator {operator}, "
+                             f"expected one of {self.OPERATORS}")
+        _check_no_vector(self, datatype)
+        super().__init__(table_name, column, value, datatype)
+        self.operator = operator
+
+    def __eq__(self, other):
+        """Check if two conditions are equal.
+
+        Args:
+            other (Condition): The other condition.
+
+        Returns:
+            bool: Whether the two conditions are equivalent.
+        """
+        return super().__eq__(other) and self.operator == other.operator
+
+    def __hash__(self):
+        """Compute hash."""
+        return hash(self.operator + str(super().__hash__()))
+
+
+class RangeCondition(EqualsCondition):
+    """An SQL BETWEEN condition. Both bounds are included.
+
+    Vectors are not supported.
+    """
+
+    def __init__(self, table_name, column, lower, upper, datatype):
+        """Initialize the condition.
+
+        Args:
+            table_name (str): The name of the table.
+            column (str): The column object.
+            lower (Any): The lower bound.
+            upper (Any): The upper bound.
+            datatype (str): The datatype of the column.
+
+        Raises:
+            ValueError: The datatype is a vector.
+        """
+        _check_no_vector(self, datatype)
+        self.table_name = table_name
+        self.column = column
+        self.lower = convert_from(lower, datatype)
+        self.upper = convert_from(upper, datatype)
+        self.datatype = datatype
+
+    @property
+    def value(self):
+        """Return the lower and the upper bound."""
+        return self.lower, self.upper
+
+
+class LikeCondition(EqualsCondition):
+    """An SQL LIKE condition.
+
+    Whether the pattern is case sensitive depends on the database.
+    """
+
+    def __init__(self, table_name, column, pattern,
+                 datatype=rdflib.XSD.string):
+        """Initialize the condition.
+
+        Args:
+            table_name (str): The name of the table.
+            column (str): The column object.
+            pattern (str): The pattern, with % matching any sequence of
+                characters and _ matching a single character.
+            datatype (str): The datatype of the column.
+                Defaults to xsd:string.
+        """
+        super().__init__(table_name, column, str(pattern), datatype)
+
+
+class IsNullCondition(EqualsCondition):
+    """An SQL IS NULL condition."""
+
+    def __init__(self, table_name, column, datatype=None):
+        """Initialize the condition.
+
+        Args:
+            table_name (str): The name of the table.
+            column (str): The column object.
+            datatype (str): The datatype of the column. Defaults to None.
+        """
+        self.table_name = table_name
+        self.column = column
+        self.datatype = datatype
+
+    @property
+    def value(self):
+        """Return None."""
+        return None
+
+
+class OrCondition(Condition):
+    """An SQL OR condition."""
+
+    def __init__(self, *conditions):
+        """Initialize the condition with several subconditions.
+
+        Args:
+            *conditions (Condition): The subconditions.
+
+        Raises:
+            ValueError: Invalid subconditions.
+        """
+        conditions = set(c for c in conditions if c is not None)
+        if not all(isinstance(c, Condition) for c in conditions):
+            raise ValueError(f"Invalid conditions: {conditions}")
+        self.conditions = conditions
+
+    def __eq__(self, other):
+        """Check if two conditions are equal.
+
+        Args:
+            other (Condition): The other condition.
+
+        Returns:
+            bool: Whether the two conditions are equivalent.
+        """
+        return isinstance(other, type(self)) \
+            and set(self.conditions) == set(other.conditions)
+
+    def __hash__(self):
+        """Compute hash."""
+        return hash("or" + "".join(str(hash(c)) for c in self.conditions))
+
+
+def expand_condition(condition):
+    """Expand the vectors in the condition and check the characters.
+
+    Unlike the functions of osp-core, OrConditions are kept.
+
+    Args:
+        condition (Condition): The condition to expand.
+
+    Raises:
+        ValueError: Invalid characters in the condition.
+
+    Returns:
+        Condition: The expanded condition.
+    """
+    if isinstance(condition, (AndCondition, OrCondition)):
+        return type(condition)(*map(expand_condition, condition.conditions))
+    if isinstance(condition, (InCondition, ComparisonCondition,
+                              RangeCondition, LikeCondition,
+                              IsNullCondition)):
+        check_characters(condition.table_name, condition.column,
+                         condition.datatype)
+        return condition
+    condition = expand_vector_condition(condition)
+    check_characters(condition)
+    return condition
+
+
+def where(query, condition):
+    """Filter the results of the query by the given condition.
+
+    Like SqlQuery.where, but the condition may contain the conditions
+    of this module.
+
+    Args:
+        query (SqlQuery): The query to filter.
+        condition (Condition): The condition to add.
+
+    Returns:
+        SqlQuery: The query.
+    """
+    condition = expand_condition(deepcopy(condition))
+    if condition is None:
+        return query
+    if query.condition is None:
+        query.condition = condition
+    else:
+        query.condition = AndCondition(query.condition, condition)
+    return query
+
+
+def _check_no_vector(condition, datatype):
+    """Raise an error if the datatype of a condition is a vector.
+
+    Args:
+        condition (Condition): The condition.
+        datatype (str): The datatype of the condition.
+
+    Raises:
+        ValueError: The datatype is a vector.
+    """
+    if str(datatype).startswith(VEC_PREFIX):
+        raise ValueError(f"{type(condition).__name__} does not support "
+                         f"vectors.")
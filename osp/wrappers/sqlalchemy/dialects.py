@@ -0,0 +1,393 @@
+"""Strategies for the different SQL dialects supported by SqlAlchemy."""
+
+import logging
+import sqlalchemy
+
+logger = logging.getLogger(__name__)
+
+PERFORMANCE_PROFILES = ("safe", "balanced", "bulk_load", "read_only")
+
+
+class Dialect:
+    """A generic SQL dialect.
+
+    Inserting a row that already exists raises an IntegrityError.
+    """
+
+    name = None
+    # Maximum number of bind parameters in a single statement.
+    max_bind_params = 999
+    # The settings to apply to each new connection for each profile.
+    performance_profiles = dict()
+
+    def configure_engine(self, engine):
+        """Configure a new engine of the dialect.
+
+        Does nothing by default.
+
+        Args:
+            engine (Engine): The SqlAlchemy engine.
+        """
+
+    def apply_performance_profile(self, engine, profile):
+        """Apply the settings of the profile to each connection of the engine.
+
+        Args:
+            engine (Engine): The SqlAlchemy engine.
+            profile (str): The name of the profile, one of
+                PERFORMANCE_PROFILES. None does not change any setting.
+
+        Raises:
+            ValueError: Unknown performance profile.
+        """
+        if profile is None:
+            return
+        if profile not in PERFORMANCE_PROFILES:
+            raise ValueError("Unknown performance profile %s. Choose one "
+                             "of %s." % (profile,
+                                         ", ".join(PERFORMANCE_PROFILES)))
+        if profile not in self.performance_profiles:
+            logger.warning("Performance profiles are not supported for %s. "
+                           "Ignoring profile %s." % (engine.dialect.name,
+                                                     profile))
+            return
+        settings = self.performance_profiles[profile]
+
+        def on_connect(dbapi_connection, connection_record):
+            self.configure_connection(dbapi_connection, settings)
+
+        sqlalchemy.event.listen(engine, "connect", on_connect)
+
+    def configure_connection(self, dbapi_connection, settings):
+        """Apply the given settings to a new connection.
+
+        Does nothing by default.
+
+        Args:
+            dbapi_connection (Any): The DBAPI connection.
+            settings (Dict[str, Any]): The settings to apply.
+        """
+
+    def insert(self, table, values):
+        """Create an INSERT statement for the given values.
+
+        Args:
+            table (Table): The SqlAlchemy table to insert into.
+            values (Union[Dict, List[Dict]]): The row or the list of rows
+                to insert.
+
+        Returns:
+            Insert: The SqlAlchemy insert statement.
+        """
+        return table.insert().values(values)
+
+    def update(self, connection, table, columns, where_columns, rows):
+        """Update many rows, each identified by the values of some columns.
+
+        The rows are updated by a single statement executed with many
+        parameter sets (executemany).
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+            table (Table): The SqlAlchemy table to update.
+            columns (List[str]): The columns to set.
+            where_columns (List[str]): The columns identifying the rows.
+            rows (List[Sequence[Any]]): The new values of the columns,
+                followed by the values of the where_columns.
+        """
+        names = ["osp_set_%s" % i for i in range(len(columns))]
+        where_names = ["osp_%s" % i for i in range(len(where_columns))]
+        stmt = table.update().where(sqlalchemy.and_(*[
+            table.c[c] == sqlalchemy.bindparam(n)
+            for c, n in zip(where_columns, where_names)
+        ])).values({
+            c: sqlalchemy.bindparam(n) for c, n in zip(columns, names)
+        })
+        connection.execute(stmt, [dict(zip(names + where_names, row))
+                                  for row in rows])
+
+    def clear_tables(self, connection, tables):
+        """Delete all rows of the given tables.
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+            tables (List[Table]): The tables to clear. Tables referencing
+                other tables come first.
+        """
+        for table in tables:
+            connection.execute(table.delete())
+
+    def describe_schema(self, connection):
+        """Describe the columns of all tables in the database.
+
+        Used to detect changes of the schema, e.g. in the type of a column.
+        The inspector is used by default, dialects override this with a
+        single query on their catalog.
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+
+        Returns:
+            List[str]: A description of each column.
+        """
+        inspector = sqlalchemy.inspect(connection)
+        return ["%s.%s %s" % (table, column["name"], column["type"])
+                for table in sorted(inspector.get_table_names())
+                for column in inspector.get_columns(table)]
+
+    def vacuum(self, connection):
+        """Give the space of deleted rows back to the operating system.
+
+        Must be called outside of a transaction. Does nothing by default.
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+        """
+
+
+class SqliteDialect(Dialect):
+    """The SQLite dialect. Duplicates are ignored by INSERT OR IGNORE."""
+
+    name = "sqlite"
+    max_bind_params = 999
+    performance_profiles = {
+        "safe": {
+            "journal_mode": "DELETE",
+            "synchronous": "FULL",
+            "temp_store": "DEFAULT",
+            "busy_timeout": 5000
+        },
+        "balanced": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -64000,  # 64 MB
+            "mmap_size": 268435456,  # 256 MB
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000
+        },
+        "bulk_load": {
+            "journal_mode": "WAL",
+            "synchronous": "OFF",
+            "cache_size": -256000,  # 256 MB
+            "mmap_size": 268435456,  # 256 MB
+            "temp_store": "MEMORY",
+            "busy_timeout": 30000
+        },
+        # only settings of the connection, the journal mode is stored in
+        # the database file
+        "read_only": {
+            "cache_size": -256000,  # 256 MB
+            "mmap_size": 1073741824,  # 1 GB
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,
+            "query_only": "ON"
+        }
+    }
+
+    def configure_engine(self, engine):
+        """Let SqlAlchemy begin the transactions instead of pysqlite.
+
+        pysqlite only begins a transaction before data modifications, so
+        a SAVEPOINT would begin its own transaction and commit on release.
+        As documented for the pysqlite dialect, its transaction handling is
+        disabled and BEGIN is emitted when SqlAlchemy begins a transaction.
+
+        Args:
+            engine (Engine): The SqlAlchemy engine.
+        """
+        def on_connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        def on_begin(connection):
+            connection.execute("BEGIN")
+
+        sqlalchemy.event.listen(engine, "connect", on_connect)
+        sqlalchemy.event.listen(engine, "begin", on_begin)
+
+    def configure_connection(self, dbapi_connection, settings):
+        """Execute the PRAGMA statements for the given settings.
+
+        Args:
+            dbapi_connection (Any): The DBAPI connection.
+            settings (Dict[str, Any]): Maps the PRAGMAs to their values.
+        """
+        cursor = dbapi_connection.cursor()
+        for pragma, value in settings.items():
+            cursor.execute("PRAGMA %s = %s" % (pragma, value))
+        cursor.close()
+
+    def insert(self, table, values):
+        """Create an INSERT OR IGNORE statement for the given values.
+
+        Args:
+            table (Table): The SqlAlchemy table to insert into.
+            values (Union[Dict, List[Dict]]): The row or the list of rows
+                to insert.
+
+        Returns:
+            Insert: The SqlAlchemy insert statement.
+        """
+        return table.insert().prefix_with("OR IGNORE").values(values)
+
+    def describe_schema(self, connection):
+        """Describe the tables and indexes with their CREATE statements.
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+
+        Returns:
+            List[str]: The CREATE statement of each table and index.
+        """
+        return [row[0] for row in connection.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL "
+            "ORDER BY type, name"
+        )]
+
+    def vacuum(self, connection):
+        """Rebuild the database file with VACUUM.
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+        """
+        connection.execute("VACUUM")
+
+
+class PostgresDialect(Dialect):
+    """The PostgreSQL dialect. Duplicates are ignored by ON CONFLICT."""
+
+    name = "postgresql"
+    max_bind_params = 32767
+
+    def insert(self, table, values):
+        """Create an INSERT ... ON CONFLICT DO NOTHING statement.
+
+        Args:
+            table (Table): The SqlAlchemy table to insert into.
+            values (Union[Dict, List[Dict]]): The row or the list of rows
+                to insert.
+
+        Returns:
+            Insert: The SqlAlchemy insert statement.
+        """
+        from sqlalchemy.dialects.postgresql import insert
+        return insert(table).values(values).on_conflict_do_nothing()
+
+    def update(self, connection, table, columns, where_columns, rows):
+        """Update many rows with UPDATE ... FROM (VALUES ...).
+
+        The driver executes an executemany as one statement per row, so the
+        rows are joined from a VALUES list instead. If a row is updated
+        several times, the last values win.
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+            table (Table): The SqlAlchemy table to update.
+            columns (List[str]): The columns to set.
+            where_columns (List[str]): The columns identifying the rows.
+            rows (List[Sequence[Any]]): The new values of the columns,
+                followed by the values of the where_columns.
+        """
+        n = len(columns)
+        rows = list({tuple(row[n:]): row for row in rows}.values())
+        preparer = connection.dialect.identifier_preparer
+        table_sql = preparer.format_table(table)
+        all_columns = list(columns) + list(where_columns)
+        types = [table.c[c].type for c in all_columns]
+        type_sql = [t.compile(dialect=connection.dialect) for t in types]
+        names = ["v%s" % i for i in range(len(all_columns))]
+        set_sql = ", ".join("%s = v.%s" % (preparer.quote(c), v)
+                            for c, v in zip(columns, names))
+        where_sql = " AND ".join(
+            "%s.%s = v.%s" % (table_sql, preparer.quote(c), v)
+            for c, v in zip(where_columns, names[n:])
+        )
+        batch_size = max(1, self.max_bind_params // len(all_columns))
+        for i in range(0, len(rows), batch_size):
+            # typed bind parameters, such that TypeDecorators are applied
+            params = list()
+            values_sql = list()
+            for r, row in enumerate(rows[i:i + batch_size]):
+                placeholders = list()
+                for j, value in enumerate(row):
+                    name = "p%s_%s" % (r, j)
+                    params.append(sqlalchemy.bindparam(name, value,
+                                                       type_=types[j]))
+                    placeholders.append("CAST(:%s AS %s)"
+                                        % (name, type_sql[j]))
+                values_sql.append("(%s)" % ", ".join(placeholders))
+            sql = "UPDATE %s SET %s FROM (VALUES %s) AS v (%s) WHERE %s" % (
+                table_sql, set_sql, ", ".join(values_sql), ", ".join(names),
+                where_sql
+            )  # nosec
+            connection.execute(sqlalchemy.text(sql).bindparams(*params))
+
+    def describe_schema(self, connection):
+        """Describe the columns of the tables in the current schema.
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+
+        Returns:
+            List[str]: The table, name and type of each column.
+        """
+        return [" ".join(row) for row in connection.execute(
+            "SELECT table_name, column_name, udt_name "
+            "FROM information_schema.columns "
+            "WHERE table_schema = current_schema() "
+            "ORDER BY table_name, ordinal_position"
+        )]
+
+    def clear_tables(self, connection, tables):
+        """Clear the given tables with TRUNCATE ... RESTART IDENTITY.
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+            tables (List[Table]): The tables to clear.
+        """
+        if not tables:
+            return
+        preparer = connection.dialect.identifier_preparer
+        connection.execute("TRUNCATE %s RESTART IDENTITY" % ", ".join(
+            preparer.format_table(t) for t in tables
+        ))  # nosec
+
+
+class MysqlDialect(Dialect):
+    """The MySQL dialect. Duplicates are handled by ON DUPLICATE KEY."""
+
+    name = "mysql"
+    max_bind_params = 65535
+
+    def insert(self, table, values):
+        """Create an INSERT ... ON DUPLICATE KEY UPDATE statement.
+
+        Args:
+            table (Table): The SqlAlchemy table to insert into.
+            values (Union[Dict, List[Dict]]): The row or the list of rows
+                to insert.
+
+        Returns:
+            Insert: The SqlAlchemy insert statement.
+        """
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(values)
+        return stmt.on_duplicate_key_update(
+            {c.name: c for c in stmt.inserted}
+        )
+
+
+DIALECTS = {
+    d.name: d for d in [SqliteDialect, PostgresDialect, MysqlDialect]
+}
+
+
+def get_dialect(engine):
+    """Get the dialect strategy for the given engine.
+
+    Args:
+        engine (Engine): The SqlAlchemy engine.
+
+    Returns:
+        Dialect: The strategy for the dialect of the engine.
+    """
+    return DIALECTS.get(engine.dialect.name, Dialect)()
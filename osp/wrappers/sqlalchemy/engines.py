@@ -0,0 +1,121 @@
+"""A process-wide registry of SqlAlchemy engines.
+
+Sessions connecting to the same URL with the same options share one engine
+and therefore one connection pool. The registry counts the sessions using
+an engine. Engines no session uses anymore are kept as idle pools, such
+that sessions opened one after another reuse their connections. Only the
+MAX_IDLE_ENGINES most recently released idle engines are kept, the others
+are disposed. In-memory SQLite databases are private to their engine and
+are never shared.
+"""
+
+import collections
+import threading
+import sqlalchemy
+from osp.wrappers.sqlalchemy.dialects import get_dialect
+
+# The maximum number of engines kept in the registry without a session.
+MAX_IDLE_ENGINES = 8
+
+_engines = dict()
+_references = dict()
+_idle = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def get_engine(url, performance_profile=None, **kwargs):
+    """Get the engine for the given URL, create it if necessary.
+
+    Every call must be paired with a call of release_engine.
+
+    Args:
+        url (str): The SqlAlchemy URL to connect to.
+        performance_profile (str): The performance profile to apply to each
+            connection of the engine, see dialects.PERFORMANCE_PROFILES.
+        **kwargs: Passed to sqlalchemy.create_engine, e.g. the options of
+            the connection pool.
+
+    Returns:
+        Engine: The shared engine for the URL and options.
+    """
+    if _is_in_memory(url):
+        return _create_engine(url, performance_profile, **kwargs)
+    key = (str(url), performance_profile, tuple(sorted(kwargs.items())))
+    with _lock:
+        if key not in _engines:
+            _engines[key] = _create_engine(url, performance_profile,
+                                           **kwargs)
+            _references[key] = 0
+        _references[key] += 1
+        _idle.pop(key, None)
+        return _engines[key]
+
+
+def release_engine(engine):
+    """Release an engine returned by get_engine.
+
+    When no session uses the engine anymore, it is kept in the registry
+    as an idle pool. The least recently released idle engine is disposed
+    if there are more than MAX_IDLE_ENGINES. Engines not in the registry
+    (in-memory SQLite) are disposed.
+
+    Args:
+        engine (Engine): The engine to release.
+    """
+    disposed = list()
+    with _lock:
+        key = next((k for k, e in _engines.items() if e is engine), None)
+        if key is None:
+            disposed.append(engine)
+        else:
+            _references[key] -= 1
+            if _references[key] == 0:
+                _idle[key] = None
+            while len(_idle) > MAX_IDLE_ENGINES:
+                oldest, _ = _idle.popitem(last=False)
+                disposed.append(_engines.pop(oldest))
+                del _references[oldest]
+    for engine in disposed:
+        engine.dispose()
+
+
+def dispose_engines():
+    """Dispose the connection pools of all engines in the registry."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _references.clear()
+        _idle.clear()
+
+
+def _create_engine(url, performance_profile, **kwargs):
+    """Create an engine, configure it for its dialect and apply the profile.
+
+    Args:
+        url (str): The SqlAlchemy URL to connect to.
+        performance_profile (str): The performance profile to apply.
+        **kwargs: Passed to sqlalchemy.create_engine.
+
+    Returns:
+        Engine: The new engine.
+    """
+    engine = sqlalchemy.create_engine(url, **kwargs)
+    dialect = get_dialect(engine)
+    dialect.configure_engine(engine)
+    dialect.apply_performance_profile(engine, performance_profile)
+    return engine
+
+
+def _is_in_memory(url):
+    """Check whether the URL refers to an in-memory SQLite database.
+
+    Args:
+        url (str): The SqlAlchemy URL.
+
+    Returns:
+        bool: Whether the database only exists in memory.
+    """
+    url = sqlalchemy.engine.url.make_url(url)
+    return url.get_backend_name() == "sqlite" \
+        and url.database in (None, "", ":memory:")
@@ -0,0 +1,128 @@
+"""Collect statistics about the SQL statements executed by a session."""
+
+import collections
+import time
+import sqlalchemy
+from sqlalchemy.sql.util import find_tables
+
+
+class StatementStats:
+    """Count statements, rows and time per operation and per table.
+
+    The rows are the row count reported by the DBAPI cursor, which is
+    unknown (and not counted) for the SELECT statements of some drivers.
+    Statements slower than a threshold are kept in a bounded log.
+    """
+
+    def __init__(self, slow_query_threshold=1.0, slow_query_log_size=100):
+        """Initialize the statistics.
+
+        Args:
+            slow_query_threshold (float): Statements taking longer than
+                this number of seconds are added to the slow query log.
+            slow_query_log_size (int): The maximum number of statements in
+                the slow query log. Older statements are discarded.
+        """
+        self.slow_query_threshold = slow_query_threshold
+        self.slow_query_log_size = slow_query_log_size
+        self._start = None
+        self.reset()
+
+    def reset(self):
+        """Reset all counters and clear the slow query log."""
+        self._operations = collections.defaultdict(self._new_counter)
+        self._tables = collections.defaultdict(self._new_counter)
+        self._total = self._new_counter()
+        self._slow_queries = collections.deque(
+            maxlen=self.slow_query_log_size
+        )
+
+    def attach(self, connection):
+        """Listen to the statements executed on the given connection.
+
+        Args:
+            connection (Connection): The SqlAlchemy connection.
+        """
+        sqlalchemy.event.listen(connection, "before_cursor_execute",
+                                self._before_cursor_execute)
+        sqlalchemy.event.listen(connection, "after_cursor_execute",
+                                self._after_cursor_execute)
+
+    def snapshot(self):
+        """Get a copy of the current statistics.
+
+        Returns:
+            Dict[str, Any]: The total number of statements, rows and
+                seconds, the same numbers per operation (select, insert,
+                update, delete, other) and per table and the slow query
+                log.
+        """
+        return {
+            **self._total,
+            "operations": {k: dict(v) for k, v in self._operations.items()},
+            "tables": {k: dict(v) for k, v in self._tables.items()},
+            "slow_queries": list(self._slow_queries)
+        }
+
+    @staticmethod
+    def _new_counter():
+        return {"statements": 0, "rows": 0, "time": 0.0}
+
+    # The start is kept on the execution context, as after_cursor_execute
+    # is not called for failing statements.
+    def _before_cursor_execute(self, conn, cursor, statement, parameters,
+                               context, executemany):
+        if context is None:
+            self._start = time.perf_counter()
+        else:
+            context.osp_query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters,
+                              context, executemany):
+        start = self._start if context is None \
+            else context.osp_query_start
+        duration = time.perf_counter() - start
+        operation, tables = self._describe(statement, context)
+        rows = max(cursor.rowcount, 0)
+        for counter in [self._total, self._operations[operation],
+                        *(self._tables[t] for t in tables)]:
+            counter["statements"] += 1
+            counter["rows"] += rows
+            counter["time"] += duration
+        if duration >= self.slow_query_threshold:
+            self._slow_queries.append({
+                "statement": statement,
+                "parameters": parameters,
+                "operation": operation,
+                "tables": sorted(tables),
+                "time": duration
+            })
+
+    @staticmethod
+    def _describe(statement, context):
+        """Get the type of operation and the tables of a statement.
+
+        Args:
+            statement (str): The SQL statement.
+            context (ExecutionContext): The context of the execution.
+
+        Returns:
+            Tuple[str, Set[str]]: The operation and the names of the tables.
+        """
+        compiled = getattr(context, "compiled", None)
+        if compiled is None or compiled.statement is None:
+            keyword = statement.lstrip().split(" ", 1)[0].lower()
+            if keyword not in ("select", "insert", "update", "delete"):
+                keyword = "other"
+            return keyword, set()
+        tables = {t.name for t in find_tables(compiled.statement,
+                                              include_crud=True)}
+        if context.isinsert:
+            return "insert", tables
+        if context.isupdate:
+            return "update", tables
+        if context.isdelete:
+            return "delete", tables
+        if isinstance(compiled.statement, sqlalchemy.sql.Select):
+            return "select", tables
+        return "other", tables
@@ -2,11 +2,117 @@
 
 import argparse
 import logging
+import os
+import uuid
+import sqlalchemy
 from osp.wrappers.sqlalchemy import SqlAlchemySession
+from osp.wrappers.sqlalchemy.schema_cache import get_schema_cache_path
+from osp.wrappers.sqlalchemy.uids import BinaryUid, is_binary_uid_type
 from osp.core.session.db.sql_migrate import SqlMigrate
 
 logger = logging.getLogger(__name__)
 
+UID_STORAGES = ("string", "binary")
+
+
+def migrate_uid_storage(url, binary=True, schema_cache_dir=None,
+                        chunk_size=10000):
+    """Change how the uids of the CUDS objects are stored.
+
+    On PostgreSQL, the type of the column is changed in place. On other
+    dialects, the table of the CUDS objects is copied.
+
+    Args:
+        url (str): The sqlalchemy url to connect to the database.
+        binary (bool): Whether to store the uids in binary form (native
+            UUID on PostgreSQL, 16 bytes otherwise) or as 36 characters.
+        schema_cache_dir (str): The schema cache directory of the sessions
+            using the database. The cached schema of the database is
+            removed, since it contains the old type of the column.
+        chunk_size (int): The number of rows to copy at once.
+    """
+    table_name = SqlAlchemySession.CUDS_TABLE
+    engine = sqlalchemy.create_engine(url)
+    try:
+        with engine.begin() as conn:
+            old = sqlalchemy.Table(table_name, sqlalchemy.MetaData(),
+                                   autoload=True, autoload_with=conn)
+            if is_binary_uid_type(old.c.uid.type) == binary:
+                logger.info("The uids are already stored as %s."
+                            % UID_STORAGES[binary])
+                return
+            if conn.dialect.name == "postgresql":
+                column_type = "UUID" if binary else "VARCHAR(36)"
+                conn.execute(
+                    "ALTER TABLE %s ALTER COLUMN uid TYPE %s USING uid::%s"
+                    % (conn.dialect.identifier_preparer.format_table(old),
+                       column_type, column_type)
+                )  # nosec
+            else:
+                _copy_cuds_table(conn, old, binary, chunk_size)
+    finally:
+        engine.dispose()
+    if schema_cache_dir is not None:
+        path = get_schema_cache_path(schema_cache_dir, url)
+        if os.path.exists(path):
+            os.remove(path)
+    logger.info("Migrated the uids to %s." % UID_STORAGES[binary])
+
+
+def _copy_cuds_table(conn, old, binary, chunk_size):
+    """Replace the table of the CUDS objects by a copy with a new uid type.
+
+    Args:
+        conn (Connection): The connection to the database.
+        old (Table): The reflected table of the CUDS objects.
+        binary (bool): Whether to store the uids in binary form.
+        chunk_size (int): The number of rows to copy at once.
+    """
+    preparer = conn.dialect.identifier_preparer
+    new = sqlalchemy.Table(
+        old.name + "_MIGRATE", sqlalchemy.MetaData(),
+        *[sqlalchemy.Column(
+            c.name,
+            (BinaryUid() if binary else sqlalchemy.String(36))
+            if c.name == "uid" else c.type,
+            primary_key=c.primary_key
+        ) for c in old.columns]
+    )
+    new.create(conn)
+    result = conn.execute(sqlalchemy.select([old.c.cuds_idx, old.c.uid]))
+    rows = result.fetchmany(chunk_size)
+    while rows:
+        conn.execute(new.insert(), [
+            {"cuds_idx": cuds_idx, "uid": _to_uid_string(uid)}
+            for cuds_idx, uid in rows
+        ])
+        rows = result.fetchmany(chunk_size)
+    indexes = [(i.name, [c.name for c in i.columns], i.unique)
+               for i in old.indexes]
+    old.drop(conn)
+    conn.execute("ALTER TABLE %s RENAME TO %s" % (
+        preparer.format_table(new), preparer.format_table(old)
+    ))  # nosec
+    table = sqlalchemy.Table(old.name, sqlalchemy.MetaData(),
+                             autoload=True, autoload_with=conn)
+    for name, columns, unique in indexes:
+        sqlalchemy.Index(name, *[table.c[c] for c in columns],
+                         unique=unique).create(conn)
+
+
+def _to_uid_string(value):
+    """Convert a uid read from the database to a string.
+
+    Args:
+        value (Union[str, bytes]): The stored uid.
+
+    Returns:
+        str: The uid.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return str(uuid.UUID(bytes=bytes(value)))
+    return str(uuid.UUID(str(value)))
+
 
 def install_from_terminal():
     """Migrate sqlite databases from terminal."""
@@ -16,6 +122,14 @@ def install_from_terminal():
     )
     parser.add_argument("url", type=str,
                         help="The sqlalchemy url to connect to the database.")
+    parser.add_argument("--uid-storage", choices=UID_STORAGES,
+                        help="Convert the uids to the given storage. "
+                             "binary uses native UUID on PostgreSQL and "
+                             "16 bytes on other databases.")
+    parser.add_argument("--schema-cache-dir", type=str,
+                        help="The schema cache directory of the sessions. "
+                             "The cached schema of the database is removed "
+                             "when converting the uids.")
 
     args = parser.parse_args()
 
@@ -23,6 +137,10 @@ def install_from_terminal():
         m = SqlMigrate(session)
         m.run()
 
+    if args.uid_storage is not None:
+        migrate_uid_storage(args.url, args.uid_storage == "binary",
+                            args.schema_cache_dir)
+
 
 if __name__ == "__main__":
     install_from_terminal()
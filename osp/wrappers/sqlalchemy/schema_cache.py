@@ -0,0 +1,229 @@
+"""Persist the reflected schema of a database between sessions.
+
+The schema is stored as JSON: the tables with the names, types and keys of
+their columns. Types are looked up by name among the types of SqlAlchemy
+and of the dialect, so loading a cache file never executes code.
+"""
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import tempfile
+import sqlalchemy
+from osp.wrappers.sqlalchemy.uids import BinaryUid
+from osp.wrappers.sqlalchemy.vectors import PackedVector
+
+logger = logging.getLogger(__name__)
+
+# The attributes of column types stored in the cache.
+TYPE_ARGUMENTS = ("length", "precision", "scale", "asdecimal", "timezone",
+                  "as_uuid", "dimensions")
+
+
+def get_schema_cache_path(cache_dir, url):
+    """Get the path of the schema cache file for the given database.
+
+    The URL is hashed, such that no credentials end up in the file name.
+
+    Args:
+        cache_dir (str): The directory containing the cache files.
+        url (str): The SqlAlchemy URL of the database.
+
+    Returns:
+        str: The path to the cache file.
+    """
+    digest = hashlib.sha256(str(url).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, "schema_%s.json" % digest)
+
+
+def get_schema_fingerprint(table_names, columns=()):
+    """Compute the fingerprint of a schema.
+
+    Args:
+        table_names (Iterable[str]): The names of the tables in the database.
+        columns (Iterable[str]): A description of the columns of the tables,
+            see Dialect.describe_schema.
+
+    Returns:
+        str: The fingerprint.
+    """
+    content = "\n".join([sqlalchemy.__version__] + sorted(table_names)
+                        + list(columns))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def load_schema_cache(path, fingerprint, dialect):
+    """Load the cached metadata, if it matches the given fingerprint.
+
+    Args:
+        path (str): The path to the cache file.
+        fingerprint (str): The fingerprint of the current schema.
+        dialect (Dialect): The SqlAlchemy dialect of the database.
+
+    Returns:
+        MetaData: The cached metadata or None if there is no cache file or
+            the schema changed.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            content = json.load(f)
+        if content["fingerprint"] != fingerprint:
+            logger.debug("Schema changed. Ignoring schema cache %s" % path)
+            return None
+        return _load_metadata(content["tables"], _get_type_classes(dialect))
+    except Exception as e:
+        logger.warning("Ignoring invalid schema cache %s: %s" % (path, e))
+        return None
+
+
+def save_schema_cache(path, fingerprint, metadata):
+    """Write the metadata to the cache file.
+
+    Args:
+        path (str): The path to the cache file.
+        fingerprint (str): The fingerprint of the schema.
+        metadata (MetaData): The metadata to cache.
+    """
+    content = {
+        "fingerprint": fingerprint,
+        "tables": [_dump_table(t) for t in metadata.sorted_tables]
+    }
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(content, f, indent=1)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def _dump_table(table):
+    """Describe a table by JSON serializable values.
+
+    Args:
+        table (Table): The table.
+
+    Returns:
+        Dict[str, Any]: The name of the table, its columns and their
+            foreign keys.
+    """
+    return {
+        "name": table.name,
+        "columns": [{
+            "name": column.name,
+            "type": _dump_type(column.type),
+            "nullable": column.nullable,
+            "primary_key": column.primary_key,
+            "autoincrement": column.autoincrement,
+            "foreign_keys": sorted(fk.target_fullname
+                                   for fk in column.foreign_keys)
+        } for column in table.columns]
+    }
+
+
+def _dump_type(column_type):
+    """Describe a column type by its name and arguments.
+
+    Args:
+        column_type (TypeEngine): The type of a column.
+
+    Returns:
+        Dict[str, Any]: The name of the type class and its arguments.
+    """
+    if isinstance(column_type, BinaryUid):
+        return {"name": "BinaryUid"}
+    if isinstance(column_type, PackedVector):
+        return {"name": "PackedVector", "datatype": column_type.datatype}
+    result = {"name": type(column_type).__name__}
+    for argument in TYPE_ARGUMENTS:
+        value = getattr(column_type, argument, None)
+        if value is not None:
+            result[argument] = value
+    item_type = getattr(column_type, "item_type", None)
+    if item_type is not None:
+        result["item_type"] = _dump_type(item_type)
+    return result
+
+
+def _load_metadata(tables, type_classes):
+    """Create the metadata for the tables described by _dump_table.
+
+    Args:
+        tables (List[Dict[str, Any]]): The description of the tables.
+        type_classes (Dict[str, type]): Maps names to column types.
+
+    Returns:
+        MetaData: The metadata containing the tables.
+    """
+    metadata = sqlalchemy.MetaData()
+    for table in tables:
+        sqlalchemy.Table(table["name"], metadata, *[
+            sqlalchemy.Column(
+                column["name"],
+                _load_type(column["type"], type_classes),
+                *[sqlalchemy.ForeignKey(target)
+                  for target in column["foreign_keys"]],
+                nullable=column["nullable"],
+                primary_key=column["primary_key"],
+                autoincrement=column["autoincrement"]
+            ) for column in table["columns"]
+        ])
+    return metadata
+
+
+def _load_type(description, type_classes):
+    """Create a column type described by _dump_type.
+
+    Args:
+        description (Dict[str, Any]): The name and arguments of the type.
+        type_classes (Dict[str, type]): Maps names to column types.
+
+    Raises:
+        ValueError: Unknown type.
+
+    Returns:
+        TypeEngine: The column type.
+    """
+    name = description["name"]
+    if name == "BinaryUid":
+        return BinaryUid()
+    if name == "PackedVector":
+        return PackedVector(description["datatype"])
+    if name not in type_classes:
+        raise ValueError("Unknown column type %s" % name)
+    cls = type_classes[name]
+    accepted = sqlalchemy.util.get_cls_kwargs(cls)
+    kwargs = {k: v for k, v in description.items()
+              if k in TYPE_ARGUMENTS and k in accepted}
+    if "item_type" in description:
+        kwargs["item_type"] = _load_type(description["item_type"],
+                                         type_classes)
+    return cls(**kwargs)
+
+
+def _get_type_classes(dialect):
+    """Get the column types of SqlAlchemy and the given dialect by name.
+
+    Args:
+        dialect (Dialect): The SqlAlchemy dialect.
+
+    Returns:
+        Dict[str, type]: Maps the class names to the column types.
+    """
+    namespace = dict(vars(sqlalchemy.types))
+    try:
+        module = importlib.import_module("sqlalchemy.dialects.%s"
+                                         % dialect.name)
+        namespace.update(vars(module))
+    except ImportError:
+        pass
+    return {name: cls for name, cls in namespace.items()
+            if isinstance(cls, type)
+            and issubclass(cls, sqlalchemy.types.TypeEngine)}
@@ -1,29 +1,166 @@
 """The session for the SqlAlchemy Wrapper."""
 
+import itertools
+import logging
+import time
+import uuid
+import numpy as np
 import sqlalchemy
 import rdflib
+from osp.core.namespaces import cuba, from_iri
 from osp.core.ontology.cuba import rdflib_cuba
+from osp.core.ontology.datatypes import convert_from, convert_to, \
+    get_python_datatype, to_uid
+from osp.core.session.buffers import BufferContext, BufferType
 from osp.core.session.db.sql_util import EqualsCondition, \
-    AndCondition, JoinCondition
+    AndCondition, JoinCondition, SqlQuery, check_characters, \
+    determine_datatype, get_data_table_name
 from osp.core.session.db.sql_wrapper_session import SqlWrapperSession
+from osp.core.session.wrapper_session import EngineContext
+from osp.core.utils.general import CUDS_IRI_PREFIX
+from osp.wrappers.sqlalchemy.cache import LruCache
+from osp.wrappers.sqlalchemy.conditions import ComparisonCondition, \
+    InCondition, IsNullCondition, LikeCondition, OrCondition, \
+    RangeCondition, where
+from osp.wrappers.sqlalchemy.dialects import get_dialect
+from osp.wrappers.sqlalchemy.engines import get_engine, release_engine
+from osp.wrappers.sqlalchemy.instrumentation import StatementStats
+from osp.wrappers.sqlalchemy.schema_cache import get_schema_cache_path, \
+    get_schema_fingerprint, load_schema_cache, save_schema_cache
+from osp.wrappers.sqlalchemy.uids import BinaryUid, is_binary_uid_type
+from osp.wrappers.sqlalchemy.vectors import PackedVector, \
+    is_vector_datatype, pack_vector_columns, pack_vector_condition
+
+logger = logging.getLogger(__name__)
 
 
 class SqlAlchemySession(SqlWrapperSession):
     """The session for the SqlAlchemy Wrapper."""
 
-    def __init__(self, url, **kwargs):
+    def __init__(self, url, write_buffer=True, statement_cache_size=128,
+                 schema_cache_dir=None, pool_size=None, max_overflow=None,
+                 pool_recycle=None, pool_pre_ping=None, stream_results=False,
+                 stream_chunk_size=1000, performance_profile=None,
+                 collect_stats=False, slow_query_threshold=1.0,
+                 slow_query_log_size=100, cuds_cache_size=100000,
+                 entity_cache_size=10000, binary_uids=False,
+                 packed_vectors=False, create_planned_indexes=False,
+                 **kwargs):
         """Initialize the wrapper.
 
         Args:
             url (str): The SqlAlchemy URL to use to connect.
+            write_buffer (bool): Whether to collect the inserts into tables
+                without generated primary keys, the updates and the deletes
+                during a transaction and write them as multi-row
+                statements, batched updates and set-based deletes.
+                Defaults to True.
+            statement_cache_size (int): The number of compiled select
+                statements to keep. 0 disables the cache. Defaults to 128.
+            schema_cache_dir (str): A directory to store the reflected
+                schema of the database in. Sessions for the same URL reuse
+                the stored schema as long as the tables in the database do
+                not change. Defaults to None (no schema cache).
+            pool_size (int): The number of connections to keep open in the
+                connection pool. Defaults to None (SqlAlchemy default).
+            max_overflow (int): The number of connections to open in
+                addition to pool_size. Defaults to None (SqlAlchemy default).
+            pool_recycle (int): Replace connections older than this number
+                of seconds. Defaults to None (SqlAlchemy default).
+            pool_pre_ping (bool): Test connections for liveness when they
+                are taken from the pool. Defaults to None (SqlAlchemy
+                default).
+            stream_results (bool): Whether to stream the results of
+                queries (e.g. using server side cursors on PostgreSQL)
+                instead of loading them into memory at once.
+                Defaults to False.
+            stream_chunk_size (int): The number of rows to fetch at once
+                when streaming results. Defaults to 1000.
+            performance_profile (str): A set of settings applied to each
+                connection. For SQLite, one of "safe", "balanced",
+                "bulk_load" and "read_only" sets the PRAGMAs for journal
+                mode, synchronous, cache size, mmap size, temp store and
+                busy timeout. "read_only" leaves the journal mode and
+                synchronous unchanged and sets query_only, such that the
+                database is not changed. Defaults to None (no settings are
+                changed).
+            collect_stats (bool): Whether to count the executed statements,
+                see stats(). Defaults to False.
+            slow_query_threshold (float): Statements taking longer than this
+                number of seconds are logged in the stats. Defaults to 1.0.
+            slow_query_log_size (int): The maximum number of slow statements
+                kept in the stats. Defaults to 100.
+            cuds_cache_size (int): The number of uids whose cuds_idx is
+                cached. 0 disables the cache. Defaults to 100000.
+            entity_cache_size (int): The number of ontology entities whose
+                entity_idx is cached. The entities in the database are
+                loaded into the cache when the session is initialized.
+                0 disables the cache. Defaults to 10000. Both caches are
+                cleared on rollback, prune_database and _clear_database.
+                They assume that no other session deletes objects
+                meanwhile, as the database may reuse deleted indexes.
+            binary_uids (bool): Whether to store the uids in new databases
+                as native UUID on PostgreSQL and as 16 bytes on other
+                dialects, instead of 36 characters. Existing databases keep
+                their storage, use migrate.py to convert them.
+                Defaults to False.
+            packed_vectors (bool): Whether to store vectors in new data
+                tables in a single column (ARRAY on PostgreSQL, packed
+                little-endian binary on other dialects) instead of one
+                column per element. Existing data tables keep their
+                storage. Defaults to False.
+            create_planned_indexes (bool): Whether to create the indexes of
+                the index plan, including the unique (s, p, o) indexes,
+                together with new tables. Otherwise, use
+                create_missing_indexes() to create them. Defaults to False.
+
+        Sessions with the same URL, pool options and performance profile
+        share an engine and its connection pool, except for in-memory
+        SQLite databases.
         """
-        super().__init__(engine=sqlalchemy.create_engine(url),
-                         **kwargs)
+        pool_options = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_recycle": pool_recycle,
+            "pool_pre_ping": pool_pre_ping
+        }
+        engine = get_engine(url, performance_profile=performance_profile,
+                            **{k: v for k, v in pool_options.items()
+                               if v is not None})
+        super().__init__(engine=engine, **kwargs)
         self._url = url
+        self._dialect = get_dialect(self._engine)
         self._connection = self._engine.connect()
+        self._stats = None
+        if collect_stats:
+            self._stats = StatementStats(slow_query_threshold,
+                                         slow_query_log_size)
+            self._stats.attach(self._connection)
         self._transaction = None
-        self._metadata = sqlalchemy.MetaData(self._connection)
-        self._metadata.reflect(self._engine)
+        self._write_buffer = write_buffer
+        self._insert_buffer = dict()
+        self._update_buffer = dict()
+        self._delete_buffer = dict()
+        self._statement_cache = LruCache(statement_cache_size)
+        self._cuds_idx_cache = LruCache(cuds_cache_size)
+        self._entity_idx_cache = LruCache(entity_cache_size)
+        self._uncommitted_idx = list()
+        self._adding_new_cuds = False
+        self._binary_uids = binary_uids
+        self._packed_vectors = packed_vectors
+        self._packed_vector_tables = dict()
+        self._create_planned_indexes = create_planned_indexes
+        self._stream_results = stream_results
+        self._stream_chunk_size = stream_chunk_size
+        self._table_names = set(
+            sqlalchemy.inspect(self._connection).get_table_names()
+        )
+        self._schema_cache_path = None
+        if schema_cache_dir is not None:
+            self._schema_cache_path = get_schema_cache_path(schema_cache_dir,
+                                                            url)
+        self._metadata = self._load_metadata()
+        self._cached_tables = set(self._metadata.tables.keys())
 
     def __str__(self):
         """Convert the session to a string."""
@@ -31,9 +168,85 @@ class SqlAlchemySession(SqlWrapperSession):
 
     # OVERRIDE
     def close(self):
-        """Close the connection to the database."""
+        """Return the connection to the pool and release the engine."""
+        if self._connection.closed:
+            return
+        self._save_schema_cache()
         self._connection.close()
-        self._engine.dispose()
+        release_engine(self._engine)
+
+    def stats(self):
+        """Get the statistics of the statements executed by the session.
+
+        Raises:
+            RuntimeError: The session does not collect statistics.
+
+        Returns:
+            Dict[str, Any]: The total number of statements, rows and
+                seconds, the same numbers per operation (select, insert,
+                update, delete, other) and per table and the slow query
+                log.
+        """
+        if self._stats is None:
+            raise RuntimeError("The session does not collect statistics. "
+                               "Create it with collect_stats=True.")
+        return self._stats.snapshot()
+
+    def reset_stats(self):
+        """Reset the statistics of the statements executed by the session.
+
+        Raises:
+            RuntimeError: The session does not collect statistics.
+        """
+        if self._stats is None:
+            raise RuntimeError("The session does not collect statistics. "
+                               "Create it with collect_stats=True.")
+        self._stats.reset()
+
+    def _load_metadata(self):
+        """Load the metadata from the schema cache or reflect it.
+
+        Without a valid schema cache, only the tables of the triple store
+        are reflected eagerly, the data tables are reflected on first use.
+        Uids stored in binary form are converted by BinaryUid.
+
+        Returns:
+            MetaData: The metadata bound to the connection of the session.
+        """
+        metadata = None
+        if self._schema_cache_path is not None:
+            metadata = load_schema_cache(self._schema_cache_path,
+                                         self._get_schema_fingerprint(),
+                                         self._engine.dialect)
+        if metadata is not None:
+            metadata.bind = self._connection
+            return metadata
+        metadata = sqlalchemy.MetaData(self._connection)
+        triplestore_tables = set(self.COLUMNS) - {self.DATA_TABLE_PREFIX}
+        metadata.reflect(only=sorted(self._table_names & triplestore_tables))
+        cuds = metadata.tables.get(self.CUDS_TABLE)
+        if cuds is not None and is_binary_uid_type(cuds.c.uid.type):
+            cuds.c.uid.type = BinaryUid()
+        return metadata
+
+    def _save_schema_cache(self):
+        """Store the reflected schema, if it changed in this session."""
+        if self._schema_cache_path is None \
+                or set(self._metadata.tables.keys()) == self._cached_tables:
+            return
+        save_schema_cache(self._schema_cache_path,
+                          self._get_schema_fingerprint(), self._metadata)
+        self._cached_tables = set(self._metadata.tables.keys())
+
+    def _get_schema_fingerprint(self):
+        """Compute the fingerprint of the tables and columns in the database.
+
+        :return: The fingerprint.
+        :rtype: str
+        """
+        return get_schema_fingerprint(
+            self._table_names, self._dialect.describe_schema(self._connection)
+        )
 
     # OVERRIDE
     def _init_transaction(self):
@@ -41,28 +254,1295 @@ class SqlAlchemySession(SqlWrapperSession):
 
     # OVERRIDE
     def _rollback_transaction(self):
+        self._clear_idx_caches()
+        self._insert_buffer = dict()
+        self._update_buffer = dict()
+        self._delete_buffer = dict()
         self._transaction.rollback()
         self._transaction = None
 
     # OVERRIDE
     def _commit(self):
+        self._flush_writes()
         self._transaction.commit()
+        self._transaction = None
+        self._uncommitted_idx = list()
+
+    def statement_cache_info(self):
+        """Get the statistics of the cache for compiled select statements.
+
+        Returns:
+            Dict[str, int]: The number of hits, misses and evictions,
+                the current size and the maximum size of the cache.
+        """
+        return self._statement_cache.info()
+
+    def identifier_cache_info(self):
+        """Get the statistics of the caches for cuds_idx and entity_idx.
+
+        Returns:
+            Dict[str, Dict[str, int]]: The number of hits, misses and
+                evictions, the current size and the maximum size of the
+                "cuds" and the "entities" cache.
+        """
+        return {"cuds": self._cuds_idx_cache.info(),
+                "entities": self._entity_idx_cache.info()}
+
+    # OVERRIDE
+    def _initialize(self):
+        super()._initialize()
+        self._entity_idx_cache.clear()
+        for entity_idx, ns_idx, name in self._default_select(
+                self.ENTITIES_TABLE):
+            self._entity_idx_cache.put((ns_idx, name), entity_idx)
+
+    # OVERRIDE
+    def _get_cuds_idx(self, uid):
+        cuds_idx = self._cuds_idx_cache.get(uid)
+        if cuds_idx is None:
+            cuds_idx = super()._get_cuds_idx(uid)
+            self._cache_idx(self._cuds_idx_cache, uid, cuds_idx)
+        return cuds_idx
+
+    # OVERRIDE
+    def _get_entity_idx(self, ns_idx, name):
+        entity_idx = self._entity_idx_cache.get((ns_idx, name))
+        if entity_idx is None:
+            entity_idx = super()._get_entity_idx(ns_idx, name)
+            self._cache_idx(self._entity_idx_cache, (ns_idx, name),
+                            entity_idx)
+        return entity_idx
+
+    def _clear_idx_caches(self):
+        """Forget the cached cuds_idx and entity_idx.
+
+        Called whenever the indexes in the database may have been reset.
+        """
+        self._cuds_idx_cache.clear()
+        self._entity_idx_cache.clear()
+        self._uncommitted_idx = list()
+
+    def _cache_idx(self, cache, key, idx):
+        """Cache an index, remember it if the transaction may roll back.
+
+        :param cache: The cache to add the index to.
+        :type cache: LruCache
+        :param key: The uid or the namespace index and name of the entity.
+        :type key: Hashable
+        :param idx: The index in the database.
+        :type idx: int
+        """
+        if idx is None:
+            return
+        cache.put(key, idx)
+        if self._transaction is not None:
+            self._uncommitted_idx.append((cache, key))
+
+    # OVERRIDE
+    def _get_conditions(self, triple, table_name, object_datatype):
+        """Use the cached indexes of subject and predicate if possible.
+
+        The cached indexes are compared with the columns of the table
+        directly, instead of the joined uid and entity name.
+        """
+        s, p, o = triple
+        conditions = list()
+        if s is not None:
+            cuds_idx = self._cuds_idx_cache.get(to_uid(s))
+            if cuds_idx is not None:
+                conditions.append(EqualsCondition(
+                    table_name, "s", cuds_idx, rdflib.XSD.integer
+                ))
+                s = None
+        if p is not None and table_name != self.TYPES_TABLE:
+            entity_idx = self._entity_idx_cache.get(self._split_namespace(p))
+            if entity_idx is not None:
+                conditions.append(EqualsCondition(
+                    table_name, "p", entity_idx, rdflib.XSD.integer
+                ))
+                p = None
+        condition = super()._get_conditions((s, p, o), table_name,
+                                            object_datatype)
+        return AndCondition(*conditions, *condition.conditions)
+
+    def iter_by_oclass(self, oclass, page_size=1000, evict=False):
+        """Iterate over the CUDS objects of an oclass, page by page.
+
+        Unlike load_by_oclass, the matching objects are not determined at
+        once. Their cuds_idx are walked with keyset pagination and each
+        page is loaded with one query per table. CUDS objects of
+        subclasses are included.
+
+        Args:
+            oclass (OntologyClass): The oclass of the CUDS objects.
+            page_size (int): The number of CUDS objects per page.
+                Defaults to 1000.
+            evict (bool): Whether to remove the CUDS objects of a page from
+                the session before the next page is loaded, such that the
+                memory used does not grow with the number of objects.
+                Objects with uncommitted changes and the root are kept.
+                Evicted objects are detached, load them again to use them.
+                Defaults to False.
+
+        Raises:
+            RuntimeError: The session is not yet initialized.
+
+        Yields:
+            Cuds: The CUDS objects, in the order they were first stored.
+        """
+        if self.root is None:
+            raise RuntimeError("This Session is not yet initialized. "
+                               "Add it to a wrapper first.")
+        oclasses = self._get_entity_indexes(oclass.subclasses)
+        if not oclasses:
+            return
+        types = self._get_sqlalchemy_table(self.TYPES_TABLE).alias("t")
+        cuds = self._get_sqlalchemy_table(self.CUDS_TABLE).alias("c")
+        stmt = sqlalchemy.select([cuds.c.cuds_idx, cuds.c.uid]).distinct() \
+            .select_from(types.join(cuds, cuds.c.cuds_idx == types.c.s)) \
+            .where(types.c.o.in_(oclasses)) \
+            .order_by(cuds.c.cuds_idx).limit(page_size)
+        last = None
+        while True:
+            self._flush_writes([self.TYPES_TABLE, self.CUDS_TABLE])
+            page_stmt = stmt if last is None \
+                else stmt.where(cuds.c.cuds_idx > last)
+            rows = self._connection.execute(page_stmt).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            uids = [convert_to(uid, "UID") for _, uid in rows]
+            page = list(self.load(*[
+                self.root if uid == uuid.UUID(int=0) else uid
+                for uid in uids
+            ]))
+            yield from page
+            if evict:
+                self._evict(page)
+            if len(rows) < page_size:
+                return
+
+    def _evict(self, cuds_objects):
+        """Remove CUDS objects without local changes from the session.
+
+        The evicted objects are removed from the registry and their triples
+        from the graph of the session.
+
+        :param cuds_objects: The CUDS objects to evict.
+        :type cuds_objects: Iterable[Cuds]
+        """
+        keep = self._get_buffer_uids(BufferContext.USER) \
+            | self._get_buffer_uids(BufferContext.ENGINE) | {self.root}
+        for cuds_object in cuds_objects:
+            if cuds_object is None or cuds_object.uid in keep \
+                    or cuds_object.uid not in self._registry:
+                continue
+            del self._registry[cuds_object.uid]
+            self._expired.discard(cuds_object.uid)
+            self.graph.remove((cuds_object.iri, None, None))
+
+    def bulk_add(self, cuds_objects, rel=cuba.activeRelationship,
+                 chunk_size=10000, savepoints=False, progress=None):
+        """Add many CUDS objects to the wrapper in chunks.
+
+        The CUDS objects (with their subtrees) are consumed from the
+        iterable chunk by chunk. Each chunk is written and committed
+        before the next one is read, and the written objects are removed
+        from the session afterwards, so neither the buffers nor the
+        transaction grow with the size of the dataset. Pending changes of
+        the session are committed first. The subtrees of different
+        chunks must not overlap.
+
+        Args:
+            cuds_objects (Iterable[Cuds]): The CUDS objects to add. They
+                must not be stored in the database yet.
+            rel (OntologyRelationship): The relationship from the wrapper
+                to the added objects. Defaults to cuba.activeRelationship.
+            chunk_size (int): The number of CUDS objects per chunk.
+                Defaults to 10000.
+            savepoints (bool): Whether to write all chunks in a single
+                transaction with a savepoint per chunk instead of
+                committing each chunk. A chunk that fails is rolled back
+                to its savepoint and skipped, the other chunks are
+                committed at the end. Defaults to False.
+            progress (Callable[[Dict[str, Any]], None]): Called with the
+                report (see below) after each chunk. Defaults to None.
+
+        Raises:
+            RuntimeError: The session is not yet initialized.
+
+        Returns:
+            Dict[str, Any]: The number of added CUDS objects, the number
+                of rows written (one per triple), the number of CUDS
+                objects in failed chunks, the elapsed seconds and the
+                rows per second.
+        """
+        if self.root is None:
+            raise RuntimeError("This Session is not yet initialized. "
+                               "Add it to a wrapper first.")
+        if not self._is_root_stored():
+            # the wrapper is written when it is updated, not by _add_chunk
+            self._notify_update(self._registry.get(self.root))
+        if self._get_buffer_uids(BufferContext.USER):
+            self.commit()
+        report = {"cuds_objects": 0, "rows": 0, "failed": 0,
+                  "seconds": 0.0, "rows_per_second": 0.0}
+        start = time.perf_counter()
+        iterator = iter(cuds_objects)
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if savepoints:
+            self._init_transaction()
+        try:
+            while chunk:
+                if savepoints:
+                    rows = self._add_chunk_in_savepoint(chunk, rel)
+                else:
+                    self._init_transaction()
+                    rows = self._add_chunk(chunk, rel)
+                    self._commit()
+                if rows is None:
+                    report["failed"] += len(chunk)
+                else:
+                    report["cuds_objects"] += len(chunk)
+                    report["rows"] += rows
+                report["seconds"] = time.perf_counter() - start
+                report["rows_per_second"] = \
+                    report["rows"] / max(report["seconds"], 1e-9)
+                logger.info("Added %s CUDS objects (%.0f rows/s)"
+                            % (report["cuds_objects"],
+                               report["rows_per_second"]))
+                if progress is not None:
+                    progress(dict(report))
+                chunk = list(itertools.islice(iterator, chunk_size))
+            if savepoints:
+                self._commit()
+        except Exception as e:
+            if self._transaction is not None:
+                self._rollback_transaction()
+                self._forget_rolled_back(0)
+            raise e
+        finally:
+            # the chunks are evicted, only the links of the wrapper are stale
+            self.expire(self.root)
+        return report
+
+    def _is_root_stored(self):
+        """Check whether the type of the wrapper is stored in the database.
+
+        :return: Whether the wrapper has been committed before.
+        :rtype: bool
+        """
+        self._flush_writes([self.TYPES_TABLE, self.CUDS_TABLE])
+        types = self._get_sqlalchemy_table(self.TYPES_TABLE)
+        cuds = self._get_sqlalchemy_table(self.CUDS_TABLE)
+        stmt = sqlalchemy.select([types.c.s]) \
+            .select_from(types.join(cuds, cuds.c.cuds_idx == types.c.s)) \
+            .where(cuds.c.uid == convert_from(uuid.UUID(int=0), "UID")) \
+            .limit(1)
+        return self._connection.execute(stmt).first() is not None
+
+    def _add_chunk(self, cuds_objects, rel):
+        """Write a chunk of CUDS objects in the current transaction.
+
+        The objects are added to the wrapper, written together with the
+        relationships from the wrapper to them and removed from the session
+        again. The wrapper itself is not rewritten.
+
+        :param cuds_objects: The CUDS objects to add.
+        :type cuds_objects: List[Cuds]
+        :param rel: The relationship from the wrapper to the objects.
+        :type rel: OntologyRelationship
+        :return: The number of written triples.
+        :rtype: int
+        """
+        wrapper = self._registry.get(self.root)
+        added = dict()
+        try:
+            self._adding_new_cuds = True
+            try:
+                wrapper.add(*cuds_objects, rel=rel)
+            finally:
+                self._adding_new_cuds = False
+            added = dict(self._buffers[BufferContext.USER][BufferType.ADDED])
+            links = [t for x in cuds_objects
+                     for t in self.graph.triples((wrapper.iri, None, x.iri))]
+            with EngineContext(self):
+                triples = list(self._substitute_root_iri(itertools.chain(
+                    links, *(x.get_triples() for x in added.values())
+                )))
+                self._add(*triples)
+                self._flush_writes()
+        finally:
+            self._reset_buffers(BufferContext.USER)
+            self._evict(added.values())
+            for x in cuds_objects:
+                self.graph.remove((wrapper.iri, None, x.iri))
+        return len(triples)
+
+    def _add_chunk_in_savepoint(self, cuds_objects, rel):
+        """Write a chunk of CUDS objects in a savepoint.
+
+        :param cuds_objects: The CUDS objects to add.
+        :type cuds_objects: List[Cuds]
+        :param rel: The relationship from the wrapper to the objects.
+        :type rel: OntologyRelationship
+        :return: The number of written triples, None if the chunk failed
+            and was rolled back to the savepoint.
+        :rtype: Optional[int]
+        """
+        savepoint = self._connection.begin_nested()
+        uncommitted = len(self._uncommitted_idx)
+        try:
+            rows = self._add_chunk(cuds_objects, rel)
+            savepoint.commit()
+            return rows
+        except Exception as e:
+            savepoint.rollback()
+            if not isinstance(e, sqlalchemy.exc.SQLAlchemyError):
+                raise e
+            self._forget_rolled_back(uncommitted)
+            logger.warning("Skipped a chunk of %s CUDS objects: %s"
+                           % (len(cuds_objects), e))
+            return None
+
+    def _forget_rolled_back(self, uncommitted):
+        """Forget the state of the session written after a savepoint.
+
+        :param uncommitted: The number of uncommitted indexes cached before
+            the savepoint.
+        :type uncommitted: int
+        """
+        for cache, key in self._uncommitted_idx[uncommitted:]:
+            cache.pop(key)
+        del self._uncommitted_idx[uncommitted:]
+        self._insert_buffer = dict()
+        self._update_buffer = dict()
+        self._delete_buffer = dict()
+        self._load_namespace_indexes()
+        table_names = set(
+            sqlalchemy.inspect(self._connection).get_table_names()
+        )
+        if table_names != self._table_names:
+            self._table_names = table_names
+            self._metadata = self._load_metadata()
+            self._statement_cache.clear()
+
+    # OVERRIDE
+    def _load_from_backend(self, uids, expired=None):
+        if not self._adding_new_cuds:
+            yield from super()._load_from_backend(uids, expired=expired)
+            return
+        # bulk_add only adds new CUDS objects, do not look them up.
+        # Expired objects and the wrapper are stored, so they are loaded.
+        for uid in uids:
+            if uid == self.root or uid in (expired or ()):
+                yield from super()._load_from_backend([uid], expired=expired)
+            else:
+                yield None
+
+    def load_subtree(self, uid, rel=cuba.activeRelationship, max_depth=None):
+        """Load a CUDS object and all CUDS objects reachable from it.
+
+        The reachable CUDS objects are determined by a recursive query in
+        the database and then loaded with one query per table.
+
+        Args:
+            uid (UUID): The uid of the CUDS object to start from.
+            rel (OntologyRelationship): Only follow this relationship and
+                its sub-relationships. Defaults to cuba.activeRelationship.
+            max_depth (int): The maximum number of relationships to follow
+                from the start. Defaults to None (no limit).
+
+        Returns:
+            Cuds: The CUDS object with the given uid, or None if it does
+                not exist.
+        """
+        uids = self._get_subtree_uids(uid, rel, max_depth)
+        if not uids:
+            return None
+        return list(self.load(*uids))[0]
+
+    def _get_subtree_uids(self, uid, rel, max_depth):
+        """Get the uids of the CUDS objects reachable from the given one.
+
+        :param uid: The uid of the CUDS object to start from.
+        :type uid: UUID
+        :param rel: Only follow this relationship and its sub-relationships.
+        :type rel: OntologyRelationship
+        :param max_depth: The maximum number of relationships to follow.
+        :type max_depth: int
+        :return: The uids, starting with the given one. Empty if the given
+            uid does not exist.
+        :rtype: List[UUID]
+        """
+        self._flush_writes([self.CUDS_TABLE, self.RELATIONSHIP_TABLE])
+        start = uuid.UUID(int=0) if uid == self.root else uid
+        cuds = self._get_sqlalchemy_table(self.CUDS_TABLE)
+        subtree = self._get_subtree_cte(start, rel, max_depth)
+        stmt = sqlalchemy.select([cuds.c.uid]).distinct().select_from(
+            cuds.join(subtree, cuds.c.cuds_idx == subtree.c.idx)
+        )
+        uids = {convert_to(row[0], "UID")
+                for row in self._connection.execute(stmt)}
+        if start not in uids:
+            return []
+        uids = [x if x != uuid.UUID(int=0) else self.root
+                for x in uids - {start}]
+        return [uid] + uids
+
+    def _get_subtree_cte(self, uid, rel=None, max_depth=None):
+        """Get a recursive query for the objects reachable from the given one.
+
+        Without a maximum depth, UNION removes the visited objects, so the
+        recursion ends on cycles.
+
+        :param uid: The uid of the CUDS object to start from, as stored in
+            the database.
+        :type uid: UUID
+        :param rel: Only follow this relationship and its sub-relationships.
+            None follows all relationships.
+        :type rel: OntologyRelationship
+        :param max_depth: The maximum number of relationships to follow.
+        :type max_depth: int
+        :return: The common table expression, whose column idx contains the
+            cuds_idx of the reachable objects.
+        :rtype: CTE
+        """
+        cuds = self._get_sqlalchemy_table(self.CUDS_TABLE)
+        r = self._get_sqlalchemy_table(self.RELATIONSHIP_TABLE).alias("r")
+        columns = [cuds.c.cuds_idx.label("idx")]
+        if max_depth is not None:
+            columns.append(sqlalchemy.literal(0).label("depth"))
+        subtree = sqlalchemy.select(columns) \
+            .where(cuds.c.uid == convert_from(uid, "UID")) \
+            .cte("subtree", recursive=True)
+        columns = [r.c.o]
+        if max_depth is not None:
+            columns.append(subtree.c.depth + 1)
+        step = sqlalchemy.select(columns).where(r.c.s == subtree.c.idx)
+        if rel is not None:
+            step = step.where(self._entity_in(r.c.p, rel.subclasses))
+        if max_depth is not None:
+            step = step.where(subtree.c.depth < max_depth)
+        return subtree.union(step)
+
+    def load_attribute_arrays(self, oclass, attributes, chunk_size=None):
+        """Load attribute values of all CUDS objects of an oclass as arrays.
+
+        The values are selected with one query, joining the types table
+        with the data tables of the attributes, and fetched in chunks.
+        No CUDS objects are created, the arrays hold the values of the
+        last commit.
+
+        Args:
+            oclass (OntologyClass): The oclass of the CUDS objects. CUDS
+                objects of subclasses are included.
+            attributes (List[OntologyAttribute]): The attributes to load.
+            chunk_size (int): The number of rows to fetch at once.
+                Defaults to the stream_chunk_size of the session.
+
+        Returns:
+            Dict[str, np.ndarray]: Maps "uid" to the uids of the CUDS
+                objects, as strings, and the argname of each attribute to
+                a masked array of its values, in the same order. The
+                elements of vectors are stacked along additional axes.
+                Missing values are masked.
+        """
+        chunk_size = chunk_size or self._stream_chunk_size
+        self._flush_writes()
+        types = self._get_sqlalchemy_table(self.TYPES_TABLE).alias("t")
+        cuds = self._get_sqlalchemy_table(self.CUDS_TABLE).alias("c")
+        joined = types.join(cuds, cuds.c.cuds_idx == types.c.s)
+        columns, readers = [cuds.c.uid], list()
+        for i, attribute in enumerate(attributes):
+            datatype = attribute.datatype or rdflib.XSD.string
+            table_name = get_data_table_name(datatype)
+            entity_idx = self._get_entity_indexes([attribute]) \
+                if table_name in self._table_names else []
+            reader = self._get_attribute_reader(datatype, len(columns))
+            if entity_idx:
+                data = self._get_sqlalchemy_table(table_name) \
+                    .alias("d%s" % i)
+                joined = joined.outerjoin(data, sqlalchemy.and_(
+                    data.c.s == types.c.s, data.c.p == entity_idx[0]
+                ))
+                columns += self._get_attribute_columns(data, datatype)
+            else:
+                columns += [sqlalchemy.null()] * reader[1]
+            readers.append(reader)
+        stmt = sqlalchemy.select(columns).select_from(joined).where(
+            self._entity_in(types.c.o, oclass.subclasses)
+        ).order_by(types.c.s)
+        result = self._connection.execution_options(stream_results=True) \
+            .execute(stmt)
+        chunks = [[] for _ in range(len(attributes) + 1)]
+        try:
+            rows = result.fetchmany(chunk_size)
+            while rows:
+                values = list(zip(*rows))
+                chunks[0].append(np.array(values[0], dtype=str))
+                for chunk, (read, _) in zip(chunks[1:], readers):
+                    chunk.append(read(values))
+                rows = result.fetchmany(chunk_size)
+        finally:
+            result.close()
+        arrays = {"uid": np.concatenate(chunks[0]) if chunks[0]
+                  else np.array([], dtype=str)}
+        for attribute, chunk, (read, _) in zip(attributes, chunks[1:],
+                                               readers):
+            if not chunk:
+                chunk = [read([()] * len(columns))]
+            arrays[attribute.argname] = np.ma.concatenate(chunk)
+        return arrays
+
+    def _get_attribute_reader(self, datatype, offset):
+        """Get a function converting selected values of an attribute.
+
+        :param datatype: The datatype of the attribute.
+        :type datatype: str
+        :param offset: The index of the first column of the attribute.
+        :type offset: int
+        :return: A function that converts the columns of a chunk of rows
+            to a masked array, and the number of columns of the attribute.
+        :rtype: Tuple[Callable, int]
+        """
+        if is_vector_datatype(datatype):
+            vector = PackedVector(datatype)
+            table_name = get_data_table_name(datatype)
+            if table_name in self._table_names \
+                    and not self._is_packed_vector_table(table_name):
+                def read_elements(values):
+                    elements = values[offset:offset + vector.size]
+                    missing = np.fromiter((v is None for v in elements[0]),
+                                          dtype=bool, count=len(elements[0]))
+                    array = np.array(
+                        [[0 if v is None else v for v in x] for x in elements],
+                        dtype=vector.dtype
+                    ).T.reshape(len(missing), *vector.shape)
+                    return self._mask_rows(array, missing)
+                return read_elements, vector.size
+
+            def read_packed(values):
+                return self._mask_rows(*vector.stack(values[offset]))
+            return read_packed, 1
+
+        dtype = get_python_datatype(datatype)[2]
+
+        def read(values):
+            column = values[offset]
+            if None not in column:
+                return np.ma.MaskedArray(np.array(column, dtype=dtype),
+                                         mask=np.zeros(len(column), bool))
+            missing = np.fromiter((v is None for v in column), dtype=bool,
+                                  count=len(column))
+            fill = dtype.type()
+            return np.ma.MaskedArray(
+                np.array([fill if v is None else v for v in column],
+                         dtype=dtype),
+                mask=missing
+            )
+        return read, 1
+
+    @staticmethod
+    def _mask_rows(array, missing):
+        """Mask the given rows of an array.
+
+        :param array: The array with one row per CUDS object.
+        :type array: np.ndarray
+        :param missing: Whether each row is missing.
+        :type missing: np.ndarray
+        :return: The masked array.
+        :rtype: np.ma.MaskedArray
+        """
+        mask = np.broadcast_to(
+            missing.reshape(-1, *([1] * (array.ndim - 1))), array.shape
+        )
+        return np.ma.MaskedArray(array, mask=mask.copy())
+
+    def _get_attribute_columns(self, table, datatype):
+        """Get the columns to select for the values of an attribute.
+
+        Packed vectors are selected in their stored form, such that they
+        can be converted to a single array, see PackedVector.stack.
+
+        :param table: The data table of the attribute (or an alias).
+        :type table: Table
+        :param datatype: The datatype of the attribute.
+        :type datatype: str
+        :return: The columns.
+        :rtype: List[Column]
+        """
+        if not is_vector_datatype(datatype):
+            return [table.c.o]
+        if "o" in table.c:
+            impl = table.c.o.type.load_dialect_impl(self._engine.dialect)
+            return [sqlalchemy.type_coerce(table.c.o, impl)]
+        vector = PackedVector(datatype)
+        return [table.c["o___%s" % k] for k in range(vector.size)]
+
+    def search(self, oclass, **predicates):
+        """Load the CUDS objects of an oclass whose attributes match.
+
+        See search_uids for the predicates.
+
+        Args:
+            oclass (OntologyClass): The oclass of the CUDS objects. CUDS
+                objects of subclasses are included.
+            **predicates: Maps the argnames of attributes to predicates.
+
+        Returns:
+            Iterator[Cuds]: The matching CUDS objects.
+        """
+        return self.load(*self.search_uids(oclass, **predicates))
+
+    def search_uids(self, oclass, **predicates):
+        """Get the uids of the CUDS objects of an oclass matching predicates.
+
+        The predicates are evaluated by the database, joining the types
+        table with the data tables of the attributes, so only the
+        committed state of the CUDS objects is searched. A predicate is
+        one of:
+
+        - a value: The attribute is equal to the value.
+        - None: The CUDS object has no value for the attribute.
+        - (operator, value): With operator one of ==, !=, <, <=, >, >=.
+        - ("between", lower, upper): The value is in the given range,
+          both bounds included.
+        - ("like", pattern): The value matches the SQL LIKE pattern.
+        - ("in", values): The value is one of the given values.
+
+        Example:
+            session.search_uids(city.Citizen, age=(">", 60),
+                                name=("like", "P%"))
+
+        Args:
+            oclass (OntologyClass): The oclass of the CUDS objects. CUDS
+                objects of subclasses are included.
+            **predicates: Maps the argnames of attributes to predicates.
+
+        Raises:
+            ValueError: Unknown attribute, vector attribute or invalid
+                predicate.
+
+        Returns:
+            List[UUID]: The uids of the matching CUDS objects.
+        """
+        attributes = {a.argname: a for a in oclass.attributes}
+        self._flush_writes()
+        types = self._get_sqlalchemy_table(self.TYPES_TABLE).alias("t")
+        cuds = self._get_sqlalchemy_table(self.CUDS_TABLE).alias("c")
+        joined = types.join(cuds, cuds.c.cuds_idx == types.c.s)
+        tables = {"t": types}
+        conditions = list()
+        for i, (name, predicate) in enumerate(sorted(predicates.items())):
+            if name not in attributes:
+                raise ValueError(f"{oclass} has no attribute {name}")
+            attribute = attributes[name]
+            datatype = attribute.datatype or rdflib.XSD.string
+            if is_vector_datatype(datatype):
+                raise ValueError(f"Cannot search by the vector attribute "
+                                 f"{name}")
+            alias = "d%s" % i
+            data = self._get_sqlalchemy_table(
+                get_data_table_name(datatype)
+            ).alias(alias)
+            joined = joined.outerjoin(data, sqlalchemy.and_(
+                data.c.s == types.c.s, self._entity_in(data.c.p, [attribute])
+            ))
+            tables[alias] = data
+            conditions.append(
+                self._get_predicate_condition(alias, predicate, datatype)
+            )
+        stmt = sqlalchemy.select([cuds.c.cuds_idx, cuds.c.uid]).distinct() \
+            .select_from(joined) \
+            .where(self._entity_in(types.c.o, oclass.subclasses)) \
+            .where(self._get_sqlalchemy_condition(AndCondition(*conditions),
+                                                  tables)) \
+            .order_by(cuds.c.cuds_idx)
+        uids = (convert_to(row[1], "UID")
+                for row in self._connection.execute(stmt))
+        return [self.root if uid == uuid.UUID(int=0) else uid
+                for uid in uids]
+
+    @staticmethod
+    def _get_predicate_condition(table_name, predicate, datatype):
+        """Get the condition on the values of a data table for a predicate.
+
+        :param table_name: The name (or alias) of the data table.
+        :type table_name: str
+        :param predicate: The predicate, see search_uids.
+        :type predicate: Any
+        :param datatype: The datatype of the values.
+        :type datatype: str
+        :raises ValueError: Invalid predicate.
+        :return: The condition on the column o.
+        :rtype: Condition
+        """
+        if predicate is None or predicate == ("==", None):
+            return IsNullCondition(table_name, "o", datatype)
+        if not isinstance(predicate, tuple):
+            return EqualsCondition(table_name, "o", predicate, datatype)
+        operator, *args = predicate
+        if operator == "==" and len(args) == 1:
+            return EqualsCondition(table_name, "o", args[0], datatype)
+        if operator == "between" and len(args) == 2:
+            return RangeCondition(table_name, "o", *args, datatype)
+        if operator == "like" and len(args) == 1:
+            return LikeCondition(table_name, "o", args[0], datatype)
+        if operator == "in" and len(args) == 1:
+            return InCondition(table_name, "o", args[0], datatype)
+        if operator in ComparisonCondition.OPERATORS and len(args) == 1:
+            return ComparisonCondition(table_name, "o", operator, args[0],
+                                       datatype)
+        raise ValueError(f"Invalid predicate {predicate}")
+
+    def count_by_oclass(self):
+        """Count the CUDS objects in the database per oclass.
+
+        The objects are counted with a single GROUP BY query, without
+        loading them. Each object is counted for its own oclass only, not
+        for the superclasses. Objects added since the last commit are not
+        counted.
+
+        Returns:
+            Dict[OntologyClass, int]: Maps the oclasses to the number of
+                CUDS objects. Oclasses of ontologies that are not installed
+                are given by their IRI.
+        """
+        self._flush_writes([self.TYPES_TABLE, self.ENTITIES_TABLE])
+        types = self._get_sqlalchemy_table(self.TYPES_TABLE).alias("t")
+        entities = self._get_sqlalchemy_table(self.ENTITIES_TABLE) \
+            .alias("e")
+        stmt = sqlalchemy.select([
+            entities.c.ns_idx, entities.c.name, sqlalchemy.func.count()
+        ]).select_from(
+            types.join(entities, entities.c.entity_idx == types.c.o)
+        ).group_by(entities.c.ns_idx, entities.c.name)
+        return {self._get_entity(ns_idx, name): count
+                for ns_idx, name, count in self._connection.execute(stmt)}
+
+    def relationship_fanout(self, rel=None, oclass=None):
+        """Get a histogram of the number of relationships per CUDS object.
+
+        The histogram is computed by the database with GROUP BY queries,
+        without loading the CUDS objects, from the relationships of the
+        last commit.
+
+        Args:
+            rel (OntologyRelationship): Only count this relationship and its
+                sub-relationships. Defaults to None (all relationships).
+            oclass (OntologyClass): Only consider the CUDS objects of this
+                oclass and its subclasses. Objects without relationships
+                are counted with a fan-out of 0. Defaults to None (all
+                CUDS objects with at least one relationship).
+
+        Returns:
+            Dict[int, int]: Maps the number of relationships to the number
+                of CUDS objects with that many relationships.
+        """
+        self._flush_writes([self.TYPES_TABLE, self.RELATIONSHIP_TABLE])
+        r = self._get_sqlalchemy_table(self.RELATIONSHIP_TABLE).alias("r")
+        on = [] if rel is None else [self._entity_in(r.c.p, rel.subclasses)]
+        if oclass is None:
+            fanout = sqlalchemy.select([
+                r.c.s, sqlalchemy.func.count().label("fanout")
+            ]).group_by(r.c.s)
+            for condition in on:
+                fanout = fanout.where(condition)
+        else:
+            types = self._get_sqlalchemy_table(self.TYPES_TABLE).alias("t")
+            fanout = sqlalchemy.select([
+                types.c.s, sqlalchemy.func.count(r.c.o).label("fanout")
+            ]).select_from(types.outerjoin(
+                r, sqlalchemy.and_(r.c.s == types.c.s, *on)
+            )).where(
+                self._entity_in(types.c.o, oclass.subclasses)
+            ).group_by(types.c.s)
+        fanout = fanout.alias("f")
+        stmt = sqlalchemy.select([
+            fanout.c.fanout, sqlalchemy.func.count()
+        ]).group_by(fanout.c.fanout)
+        return dict(sorted(self._connection.execute(stmt).fetchall()))
+
+    def attribute_statistics(self, oclass, attribute):
+        """Get the count, minimum, maximum and mean of a numeric attribute.
+
+        The statistics are computed by the database with a single query,
+        without loading the CUDS objects. Values set since the last commit
+        are not included.
+
+        Args:
+            oclass (OntologyClass): Only consider the CUDS objects of this
+                oclass and its subclasses.
+            attribute (OntologyAttribute): The attribute, with an integer
+                or float datatype.
+
+        Raises:
+            ValueError: The attribute is not numeric.
+
+        Returns:
+            Dict[str, Any]: The number of CUDS objects with a value
+                (count) and the min, max and avg of the values. min, max
+                and avg are None if there are no values.
+        """
+        datatype = attribute.datatype or rdflib.XSD.string
+        if datatype not in (rdflib.XSD.integer, rdflib.XSD.float,
+                            rdflib.XSD.double):
+            raise ValueError(f"{attribute} is not numeric")
+        table_name = get_data_table_name(datatype)
+        self._flush_writes([self.TYPES_TABLE, table_name])
+        types = self._get_sqlalchemy_table(self.TYPES_TABLE).alias("t")
+        data = self._get_sqlalchemy_table(table_name).alias("d")
+        stmt = sqlalchemy.select([
+            sqlalchemy.func.count(data.c.o), sqlalchemy.func.min(data.c.o),
+            sqlalchemy.func.max(data.c.o), sqlalchemy.func.avg(data.c.o)
+        ]).select_from(types.join(data, sqlalchemy.and_(
+            data.c.s == types.c.s,
+            self._entity_in(data.c.p, [attribute])
+        ))).where(self._entity_in(types.c.o, oclass.subclasses))
+        count, minimum, maximum, avg = self._connection.execute(stmt) \
+            .fetchone()
+        if not count:
+            return {"count": 0, "min": None, "max": None, "avg": None}
+        return {"count": count, "min": convert_to(minimum, datatype),
+                "max": convert_to(maximum, datatype), "avg": float(avg)}
+
+    def _get_entity(self, ns_idx, name):
+        """Get the ontology entity with the given name in a namespace.
+
+        :param ns_idx: The index of the namespace in the database.
+        :type ns_idx: int
+        :param name: The name of the entity in the namespace.
+        :type name: str
+        :return: The entity, or its IRI if its ontology is not installed.
+        :rtype: Union[OntologyEntity, URIRef]
+        """
+        iri = rdflib.URIRef(self._get_ns(ns_idx) + name)
+        try:
+            return from_iri(iri, raise_error=False) or iri
+        except (KeyError, ValueError):
+            return iri
+
+    # OVERRIDE
+    def _clear_database(self, vacuum=False):
+        """Delete the contents of every table.
+
+        The data tables are dropped, _initialize creates the ones for the
+        known datatypes again, with the indexes they had before. The other
+        tables are cleared by the dialect, with TRUNCATE on PostgreSQL.
+
+        Args:
+            vacuum (bool): Whether to give the space of the deleted rows
+                back to the operating system afterwards, if the dialect
+                supports it (VACUUM on SQLite). Defaults to False.
+        """
+        self._init_transaction()
+        try:
+            # clear local datastructure
+            self._reset_buffers(BufferContext.USER)
+            root = self._registry.get(self.root)
+            if root.get(rel=cuba.relationship):
+                root.remove(rel=cuba.relationship)
+            for uid in list(self._registry.keys()):
+                if uid != self.root:
+                    self._delete_cuds_triples(self._registry.get(uid))
+            self._reset_buffers(BufferContext.USER)
+
+            # delete the data
+            data_tables = self._get_table_names(self.DATA_TABLE_PREFIX)
+            inspector = sqlalchemy.inspect(self._connection)
+            indexes = {t: inspector.get_indexes(t) for t in data_tables}
+            for table_name in data_tables:
+                self._do_db_drop(table_name)
+            self._dialect.clear_tables(self._connection, [
+                self._get_sqlalchemy_table(t)
+                for t in [self.TYPES_TABLE, self.RELATIONSHIP_TABLE,
+                          self.CUDS_TABLE, self.ENTITIES_TABLE,
+                          self.NAMESPACES_TABLE]
+                if t in self._table_names
+            ])
+            self._statement_cache.clear()
+            self._clear_idx_caches()
+
+            self._initialize()
+            self._restore_indexes(indexes)
+            self._commit()
+        except Exception as e:
+            self._rollback_transaction()
+            self._table_names = set(
+                sqlalchemy.inspect(self._connection).get_table_names()
+            )
+            self._metadata = self._load_metadata()
+            raise e
+        if vacuum:
+            self._dialect.vacuum(self._connection)
+
+    def _restore_indexes(self, indexes):
+        """Create the given indexes of tables that exist again.
+
+        :param indexes: Maps the table names to their reflected indexes.
+        :type indexes: Dict[str, List[Dict[str, Any]]]
+        """
+        inspector = sqlalchemy.inspect(self._connection)
+        for table_name, reflected in indexes.items():
+            if table_name not in self._table_names:
+                continue
+            table = self._get_sqlalchemy_table(table_name)
+            existing = {i["name"] for i in inspector.get_indexes(table_name)}
+            for index in reflected:
+                if index["name"] in existing:
+                    continue
+                sqlalchemy.Index(
+                    index["name"],
+                    *[table.c[c] for c in index["column_names"]],
+                    unique=bool(index["unique"])
+                ).create(self._connection)
+
+    def prune_database(self, rel=None):
+        """Delete the CUDS objects not reachable from the wrapper.
+
+        Unlike prune, the reachable objects are determined by a recursive
+        query in the database, so nothing has to be loaded. The objects
+        are deleted from all tables with one statement per table.
+        Relationships added since the last commit are not followed, so
+        commit first. The CUDS objects of the session that were deleted
+        expire.
+
+        Args:
+            rel (OntologyRelationship): Only follow this relationship and
+                its sub-relationships. Defaults to None (all relationships).
+
+        Returns:
+            Dict[str, int]: The number of deleted rows per table.
+        """
+        self._flush_writes()
+        reachable = sqlalchemy.Table(
+            "osp_reachable", sqlalchemy.MetaData(),
+            sqlalchemy.Column("idx", sqlalchemy.Integer, primary_key=True),
+            prefixes=["TEMPORARY"]
+        )
+        reachable.create(self._connection)
+        try:
+            with self._connection.begin():
+                subtree = self._get_subtree_cte(uuid.UUID(int=0), rel)
+                self._connection.execute(reachable.insert().from_select(
+                    ["idx"], sqlalchemy.select([subtree.c.idx])
+                ))
+                deleted_uids = self._get_pruned_registry_uids(reachable)
+                deleted = dict()
+                for table_name in [self.TYPES_TABLE, self.RELATIONSHIP_TABLE,
+                                   *sorted(self._get_table_names(
+                                       self.DATA_TABLE_PREFIX)),
+                                   self.CUDS_TABLE]:
+                    table = self._get_sqlalchemy_table(table_name)
+                    column = table.c.cuds_idx \
+                        if table_name == self.CUDS_TABLE else table.c.s
+                    condition = column.notin_(
+                        sqlalchemy.select([reachable.c.idx])
+                    )
+                    if table_name == self.RELATIONSHIP_TABLE:
+                        condition = sqlalchemy.or_(condition, table.c.o.notin_(
+                            sqlalchemy.select([reachable.c.idx])
+                        ))
+                    result = self._connection.execute(
+                        table.delete().where(condition)
+                    )
+                    deleted[table_name] = result.rowcount
+        finally:
+            reachable.drop(self._connection)
+        self._clear_idx_caches()
+        self.expire(*deleted_uids)
+        logger.info("Pruned the database: %s" % deleted)
+        return deleted
+
+    def _get_pruned_registry_uids(self, reachable):
+        """Get the uids of the session's CUDS objects that are not reachable.
+
+        :param reachable: The temporary table containing the cuds_idx of the
+            reachable objects.
+        :type reachable: Table
+        :return: The uids of the CUDS objects in the registry that are
+            stored in the database but not reachable.
+        :rtype: Set[UUID]
+        """
+        cuds = self._get_sqlalchemy_table(self.CUDS_TABLE)
+        uids = [convert_from(uid, "UID") for uid in self._registry.keys()
+                if uid != self.root]
+        result = set()
+        chunk_size = self._dialect.max_bind_params
+        for i in range(0, len(uids), chunk_size):
+            stmt = sqlalchemy.select([cuds.c.uid]).where(
+                cuds.c.uid.in_(uids[i:i + chunk_size])
+            ).where(cuds.c.cuds_idx.notin_(
+                sqlalchemy.select([reachable.c.idx])
+            ))
+            result |= {convert_to(row[0], "UID")
+                       for row in self._connection.execute(stmt)}
+        return result
+
+    def _entity_in(self, column, entities):
+        """Get a condition that a column holds the index of an entity.
+
+        Entities that are not stored in the database are ignored. If none
+        of them is stored, the condition is false instead of an empty IN.
+
+        :param column: The column holding entity indexes.
+        :type column: Column
+        :param entities: The ontology entities.
+        :type entities: Iterable[OntologyEntity]
+        :return: The SqlAlchemy condition.
+        :rtype: expression
+        """
+        entity_idx = self._get_entity_indexes(entities)
+        if not entity_idx:
+            return sqlalchemy.false()
+        return column.in_(entity_idx)
+
+    def _get_entity_indexes(self, entities):
+        """Get the indexes of the given entities in the database.
+
+        :param entities: The ontology entities.
+        :type entities: Iterable[OntologyEntity]
+        :return: The indexes of the entities stored in the database.
+        :rtype: List[int]
+        """
+        entities = list(entities)
+        namespaces = {str(e.namespace.get_iri()) for e in entities}
+        if not namespaces <= set(self._ns_to_idx):
+            self._load_namespace_indexes()
+        conditions = list()
+        for entity in entities:
+            ns_iri = str(entity.namespace.get_iri())
+            if ns_iri not in self._ns_to_idx:
+                continue
+            conditions.append(AndCondition(
+                EqualsCondition(self.ENTITIES_TABLE, "ns_idx",
+                                self._ns_to_idx[ns_iri], rdflib.XSD.integer),
+                EqualsCondition(self.ENTITIES_TABLE, "name",
+                                str(entity.iri)[len(ns_iri):],
+                                rdflib.XSD.string)
+            ))
+        if not conditions:
+            return []
+        query = SqlQuery(self.ENTITIES_TABLE, ["entity_idx"],
+                         {"entity_idx": rdflib.XSD.integer})
+        return [row[0] for row in
+                self._do_db_select(where(query, OrCondition(*conditions)))]
+
+    # OVERRIDE
+    def _load_triples_for_iris(self, *iris):
+        """Load the triples of the CUDS objects with the given IRIs.
+
+        The triples are selected with one query per table for many IRIs,
+        instead of one query per table and IRI.
+
+        Args:
+            iris (URIRef): The IRIs of the CUDS objects to load.
+
+        Yields:
+            Tuple[Set[Tuple], Set[Tuple]]: The triples of each CUDS object
+                and the type triples of its neighbors, in the order of the
+                given IRIs.
+        """
+        iris = list(iris)
+        chunk_size = self._dialect.max_bind_params
+        for i in range(0, len(iris), chunk_size):
+            chunk = iris[i:i + chunk_size]
+            triples = {str(iri): set() for iri in chunk}
+            for triple in self._triples_for_iris(chunk):
+                triples[str(triple[0])].add(triple)
+            neighbors = {o for x in triples.values() for _, _, o in x
+                         if isinstance(o, rdflib.URIRef)
+                         and o.startswith(CUDS_IRI_PREFIX)}
+            neighbor_types = dict()
+            for triple in self._triples_for_iris(
+                    neighbors, tables=(self.TYPES_TABLE,)):
+                neighbor_types.setdefault(str(triple[0]), set()).add(triple)
+            for iri in chunk:
+                yield triples[str(iri)], {
+                    t for _, _, o in triples[str(iri)]
+                    for t in neighbor_types.get(str(o), ())
+                }
+
+    def _triples_for_iris(self, iris, tables=None):
+        """Get the triples of the CUDS objects with the given IRIs.
+
+        :param iris: The IRIs of the subjects.
+        :type iris: Iterable[URIRef]
+        :param tables: The tables to query. Defaults to all tables.
+        :type tables: Iterable[str]
+        :return: The triples with the given subjects.
+        :rtype: Iterator[Tuple]
+        """
+        uids = [self._split_namespace(iri) for iri in iris]
+        chunk_size = self._dialect.max_bind_params
+        for i in range(0, len(uids), chunk_size):
+            condition = InCondition("ts", "uid", uids[i:i + chunk_size],
+                                    "UID")
+            for q, t, dt in self._queries_for_subject(None, tables):
+                c = self._do_db_select(where(q, condition))
+                yield from self._rows_to_triples(
+                    cursor=c, table_name=t, object_datatype=dt
+                )
 
     # OVERRIDE
     def _db_select(self, query):
+        self._flush_writes(query.tables.values())
+        shape, values = self._get_condition_shape(query.condition)
+        key = (tuple((a, query.tables[a]) for a in query.order),
+               tuple(query.columns), shape)
+        compiled = self._statement_cache.get(key)
+        if compiled is None:
+            compiled = self._compile_select(query)
+            self._statement_cache.put(key, compiled)
+        params = {"osp_%s" % i: v for i, v in enumerate(values)}
+        if self._stream_results:
+            c = self._connection.execution_options(stream_results=True) \
+                .execute(compiled, params)
+            return self._fetch_chunks(c)
+        c = self._connection.execute(compiled, params)
+        return c
+
+    def _fetch_chunks(self, result):
+        """Iterate over the rows of the result, fetching them in chunks.
+
+        Args:
+            result (ResultProxy): The result of a query.
+
+        Yields:
+            RowProxy: The rows of the result.
+        """
+        try:
+            rows = result.fetchmany(self._stream_chunk_size)
+            while rows:
+                yield from rows
+                rows = result.fetchmany(self._stream_chunk_size)
+        finally:
+            result.close()
+
+    def _compile_select(self, query):
+        """Compile a select statement for the given query.
+
+        The values of the conditions are replaced by bind parameters,
+        such that the statement can be reused for queries of the same shape.
+
+        Args:
+            query (SqlQuery): The query to compile.
+
+        Returns:
+            Compiled: The compiled statement.
+        """
         tables = {a: self._get_sqlalchemy_table(t).alias(a)
                   for a, t in query.tables.items()}
         sqlalchemy_columns = [getattr(tables[a].c, c)
                               for a, c in query.columns]
-        condition = self._get_sqlalchemy_condition(query.condition, tables)
+        condition = self._get_sqlalchemy_condition(query.condition, tables,
+                                                   params=list())
         s = sqlalchemy.sql.select(sqlalchemy_columns).where(condition)
-        c = self._connection.execute(s)
-        return c
+        return s.compile(dialect=self._engine.dialect)
+
+    def _is_packed_vector_table(self, table_name):
+        """Check whether a table stores vectors in a single column.
+
+        For data tables of vectors that do not exist yet, the
+        packed_vectors option decides. The result for existing tables is
+        kept, such that dropped tables are recreated with the same storage.
+
+        :param table_name: The name of the table.
+        :type table_name: str
+        :return: Whether the table stores vectors in a single column.
+        :rtype: bool
+        """
+        if table_name in self._packed_vector_tables:
+            return self._packed_vector_tables[table_name]
+        if not table_name.startswith(self.DATA_TABLE_PREFIX) \
+                or not is_vector_datatype(determine_datatype(table_name)):
+            packed = False
+        elif table_name in self._metadata.tables:
+            packed = "o" in self._metadata.tables[table_name].c
+        elif table_name in self._table_names:
+            columns = sqlalchemy.inspect(self._connection) \
+                .get_columns(table_name)
+            packed = any(c["name"] == "o" for c in columns)
+        else:
+            return self._packed_vectors
+        self._packed_vector_tables[table_name] = packed
+        return packed
+
+    @staticmethod
+    def _convert_packed_values(columns, values, datatypes):
+        """Convert the values to basic types, except vectors.
+
+        :param columns: The columns of the values.
+        :type columns: List[str]
+        :param values: The values to convert.
+        :type values: List[Any]
+        :param datatypes: Maps the columns to their datatypes.
+        :type datatypes: Dict[str, str]
+        :return: The converted values. Vectors are converted by
+            PackedVector.
+        :rtype: List[Any]
+        """
+        return [v if is_vector_datatype(datatypes.get(c))
+                else convert_from(v, datatypes.get(c))
+                for c, v in zip(columns, values)]
+
+    # OVERRIDE
+    def _do_db_create(self, table_name, columns, datatypes, primary_key,
+                      generate_pk, foreign_key, indexes):
+        if not self._is_packed_vector_table(table_name):
+            return super()._do_db_create(table_name, columns, datatypes,
+                                         primary_key, generate_pk,
+                                         foreign_key, indexes)
+        check_characters(table_name, columns, datatypes, primary_key,
+                         foreign_key, indexes)
+        self._db_create(table_name, columns, datatypes, primary_key,
+                        generate_pk, foreign_key, indexes)
+
+    # OVERRIDE
+    def _do_db_select(self, query):
+        packed = {alias: query.datatypes[alias]
+                  for alias, table_name in query.tables.items()
+                  if self._is_packed_vector_table(table_name)}
+        for alias in packed:
+            query._columns[alias] = pack_vector_columns(
+                query._columns[alias]
+            )
+        if packed:
+            query.condition = pack_vector_condition(query.condition, packed)
+        return super()._do_db_select(query)
+
+    # OVERRIDE
+    def _do_db_insert(self, table_name, columns, values, datatypes):
+        if not self._is_packed_vector_table(table_name):
+            return super()._do_db_insert(table_name, columns, values,
+                                         datatypes)
+        values = self._convert_packed_values(columns, values, datatypes)
+        check_characters(table_name, columns, datatypes)
+        return self._db_insert(table_name, columns, values, datatypes)
+
+    # OVERRIDE
+    def _do_db_update(self, table_name, columns, values, condition,
+                      datatypes):
+        if not self._is_packed_vector_table(table_name):
+            return super()._do_db_update(table_name, columns, values,
+                                         condition, datatypes)
+        values = self._convert_packed_values(columns, values, datatypes)
+        check_characters(table_name, columns, condition, datatypes)
+        self._db_update(table_name, columns, values, condition, datatypes)
+
+    # OVERRIDE
+    def _do_db_delete(self, table_name, condition):
+        if not self._is_packed_vector_table(table_name):
+            return super()._do_db_delete(table_name, condition)
+        check_characters(table_name, condition)
+        self._db_delete(table_name, condition)
 
     # OVERRIDE
     def _db_create(self, table_name, columns, datatypes,
                    primary_key, generate_pk, foreign_key, indexes):
-        if table_name in self._metadata.tables:
+        if table_name in self._metadata.tables \
+                or table_name in self._table_names:
             return
         columns = [
             sqlalchemy.Column(
@@ -77,26 +1557,201 @@ class SqlAlchemySession(SqlWrapperSession):
         for index in indexes:
             sqlalchemy.Index("idx_%s_%s" % (table_name, "_".join(index)),
                              *[getattr(t.c, x) for x in index])
-        self._metadata.create_all()
+        if self._create_planned_indexes:
+            existing = [(tuple(index), False) for index in indexes]
+            for index_columns, unique in self._get_missing_plan_indexes(
+                    t, existing):
+                self._get_plan_index(t, index_columns, unique)
+        t.create(checkfirst=True)
+        self._table_names.add(table_name)
+
+    def missing_indexes(self):
+        """Get the indexes of the index plan that are absent in the database.
+
+        The index plan declares the indexes that speed up the lookups of
+        the triple store tables by subject, by subject and predicate,
+        by object (relationships and types) and by predicate and value
+        (data tables).
+
+        Returns:
+            Dict[str, List[str]]: Maps the tables to the names of their
+                missing indexes.
+        """
+        result = dict()
+        for table, plan in self._get_missing_indexes().items():
+            result[table.name] = [
+                self._get_plan_index_name(table.name, index_columns, unique)
+                for index_columns, unique in plan
+            ]
+        return result
+
+    def create_missing_indexes(self):
+        """Create the indexes of the index plan absent in the database.
+
+        Each index is created in its own transaction. Indexes that cannot be
+        created, e.g. unique indexes on tables with duplicate rows, are
+        skipped with a warning.
+
+        Returns:
+            Dict[str, List[str]]: Maps the tables to the names of the
+                created indexes.
+        """
+        result = dict()
+        for table, plan in self._get_missing_indexes().items():
+            for index_columns, unique in plan:
+                index = self._get_plan_index(table, index_columns, unique)
+                try:
+                    with self._connection.begin():
+                        index.create(self._connection)
+                except sqlalchemy.exc.DBAPIError as e:
+                    table.indexes.discard(index)
+                    logger.warning("Could not create index %s: %s"
+                                   % (index.name, e))
+                    continue
+                result.setdefault(table.name, []).append(index.name)
+        return result
+
+    def _get_missing_indexes(self):
+        """Compare the index plan with the indexes in the database.
+
+        Returns:
+            Dict[Table, List[Tuple[Tuple[str], bool]]]: Maps the tables to
+                the columns of the missing indexes and whether they are
+                unique.
+        """
+        inspector = sqlalchemy.inspect(self._connection)
+        triplestore_tables = {self.TYPES_TABLE, self.RELATIONSHIP_TABLE}
+        result = dict()
+        for table_name in sorted(self._table_names):
+            if table_name not in triplestore_tables \
+                    and not table_name.startswith(self.DATA_TABLE_PREFIX):
+                continue
+            table = self._get_sqlalchemy_table(table_name)
+            existing = [(tuple(x["column_names"]), x["unique"])
+                        for x in inspector.get_indexes(table_name)]
+            plan = self._get_missing_plan_indexes(table, existing)
+            if plan:
+                result[table] = plan
+        return result
+
+    def _get_index_plan(self, table):
+        """Get the indexes that should exist for the given table.
+
+        Value indexes of data tables are only planned if the values have a
+        bounded size, as unbounded strings and packed vectors may exceed
+        the size limit of an index entry.
+
+        Args:
+            table (Table): The table to get the index plan for.
+
+        Returns:
+            List[Tuple[Tuple[str], bool]]: The columns of the planned
+                indexes and whether they are unique.
+        """
+        if table.name == self.RELATIONSHIP_TABLE:
+            return [(("s", "p"), False), (("o", "p"), False),
+                    (("s", "p", "o"), True)]
+        if table.name == self.TYPES_TABLE:
+            return [(("s",), False), (("o", "s"), False),
+                    (("s", "o"), True)]
+        if not table.name.startswith(self.DATA_TABLE_PREFIX):
+            return []
+        value_columns = tuple(c.name for c in table.columns
+                              if c.name not in ("s", "p"))
+        plan = [(("s", "p"), False)]
+        if value_columns and all(
+            not isinstance(table.c[c].type, (sqlalchemy.String, PackedVector))
+            or isinstance(table.c[c].type, sqlalchemy.String)
+            and table.c[c].type.length is not None
+            for c in value_columns
+        ):
+            plan += [(("p", *value_columns), False),
+                     (("s", "p", *value_columns), True)]
+        return plan
+
+    def _get_missing_plan_indexes(self, table, existing):
+        """Get the indexes of the plan not covered by the existing ones.
+
+        An index is covered by an existing index or by the primary key
+        starting with the same columns. A unique index is only covered by
+        a unique index (or the primary key) on the same columns.
+
+        Args:
+            table (Table): The table to check.
+            existing (List[Tuple[Tuple[str], bool]]): The columns of the
+                existing indexes and whether they are unique.
+
+        Returns:
+            List[Tuple[Tuple[str], bool]]: The columns of the missing indexes
+                and whether they are unique.
+        """
+        primary_key = tuple(c.name for c in table.primary_key)
+        if primary_key:
+            existing = existing + [(primary_key, True)]
+        missing = list()
+        for index_columns, unique in self._get_index_plan(table):
+            if unique and any(
+                x_unique and set(x_columns) == set(index_columns)
+                for x_columns, x_unique in existing
+            ):
+                continue
+            if not unique and any(
+                x_columns[:len(index_columns)] == index_columns
+                for x_columns, _ in existing
+            ):
+                continue
+            missing.append((index_columns, unique))
+        return missing
+
+    def _get_plan_index(self, table, index_columns, unique):
+        """Create the SqlAlchemy index of the index plan.
+
+        Args:
+            table (Table): The table of the index.
+            index_columns (Tuple[str]): The columns of the index.
+            unique (bool): Whether the index is unique.
+
+        Returns:
+            Index: The index (not yet created in the database).
+        """
+        return sqlalchemy.Index(
+            self._get_plan_index_name(table.name, index_columns, unique),
+            *[getattr(table.c, x) for x in index_columns],
+            unique=unique
+        )
+
+    @staticmethod
+    def _get_plan_index_name(table_name, index_columns, unique):
+        """Get the name of an index of the index plan.
+
+        The columns of a vector are abbreviated by the name of the vector,
+        to keep the name short.
+        """
+        columns = dict.fromkeys(c.split("___")[0] for c in index_columns)
+        return "%s_%s_%s" % ("uidx" if unique else "idx", table_name,
+                             "_".join(columns))
 
     def _db_drop(self, table_name):
-        self._get_sqlalchemy_table(table_name).drop()
-
-    def _dialect_insert(self, table, values):
-        if self._url.startswith("postgres"):
-            from sqlalchemy.dialects.postgresql import insert
-            return insert(table).values(**values).on_conflict_do_nothing()
-        if self._url.startswith("mysql"):
-            from sqlalchemy.dialects.mysql import insert
-            return insert(table).values(**values).on_duplicate_key_update(
-                **values
-            )
-        return table.insert().values(**values)
+        self._flush_writes([table_name])
+        self._statement_cache.clear()
+        table = self._get_sqlalchemy_table(table_name)
+        table.drop()
+        self._metadata.remove(table)
+        self._table_names.discard(table_name)
 
     # OVERRIDE
     def _db_insert(self, table_name, columns, values, datatypes):
+        if self._write_buffer and self._transaction is not None \
+                and table_name not in self.GENERATE_PK:
+            self._flush_updates([table_name])
+            self._flush_deletes([table_name])
+            self._insert_buffer.setdefault(
+                (table_name, tuple(columns)), []
+            ).append(dict(zip(columns, values)))
+            return
+        self._flush_writes([table_name])
         table = self._get_sqlalchemy_table(table_name)
-        stmt = self._dialect_insert(table, {
+        stmt = self._dialect.insert(table, {
             column: value
             for column, value in zip(columns, values)
         })
@@ -107,8 +1762,84 @@ class SqlAlchemySession(SqlWrapperSession):
         except sqlalchemy.exc.IntegrityError:
             return
 
+    def _flush_writes(self, table_names=None):
+        """Write the buffered inserts, updates and deletes to the database.
+
+        A table has only one kind of buffered writes at a time, so the
+        order of the writes to each table is kept.
+
+        Args:
+            table_names (Iterable[str], optional): Only write the rows
+                buffered for these tables. Defaults to None (all tables).
+        """
+        if table_names is not None:
+            table_names = set(table_names)
+        self._flush_inserts(table_names)
+        self._flush_updates(table_names)
+        self._flush_deletes(table_names)
+
+    def _flush_inserts(self, table_names=None):
+        """Write the buffered inserts to the database.
+
+        Args:
+            table_names (Iterable[str], optional): Only write the rows
+                buffered for these tables. Defaults to None (all tables).
+        """
+        if table_names is not None:
+            table_names = set(table_names)
+        for key in list(self._insert_buffer.keys()):
+            table_name, columns = key
+            if table_names is None or table_name in table_names:
+                self._batch_insert(table_name, columns,
+                                   self._insert_buffer.pop(key))
+
+    def _batch_insert(self, table_name, columns, rows):
+        """Insert the given rows using multi-row INSERT statements.
+
+        The rows are split into batches, such that the number of bind
+        parameters of a statement does not exceed the limit of the dialect.
+
+        Args:
+            table_name (str): The name of the table.
+            columns (Tuple[str]): The columns of the rows.
+            rows (List[Dict[str, Any]]): The rows to insert.
+        """
+        table = self._get_sqlalchemy_table(table_name)
+        batch_size = max(1, self._dialect.max_bind_params
+                         // max(1, len(columns)))
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            try:
+                self._connection.execute(self._dialect.insert(table, batch))
+            except sqlalchemy.exc.IntegrityError:
+                # duplicates in a dialect that does not ignore them
+                for row in batch:
+                    try:
+                        self._connection.execute(
+                            self._dialect.insert(table, row)
+                        )
+                    except sqlalchemy.exc.IntegrityError:
+                        pass
+
     # OVERRIDE
     def _db_update(self, table_name, columns, values, condition, datatypes):
+        shape, condition_values = self._get_condition_shape(condition)
+        # updates whose condition depends on the set columns are not
+        # batched, a batch would evaluate all conditions on the old values
+        if self._write_buffer and self._transaction is not None \
+                and shape is not None and not set(columns) \
+                & self._get_shape_columns(table_name, shape):
+            tables = self._get_shape_tables(shape) | {table_name}
+            key = (table_name, tuple(columns), shape)
+            self._flush_inserts(tables)
+            self._flush_updates(tables, exclude=key)
+            self._flush_deletes(tables)
+            _, _, rows = self._update_buffer.setdefault(
+                key, (condition, tables, [])
+            )
+            rows.append(list(values) + condition_values)
+            return
+        self._flush_writes([table_name])
         table = self._get_sqlalchemy_table(table_name)
         condition = self._get_sqlalchemy_condition(condition)
         stmt = table.update() \
@@ -119,24 +1850,243 @@ class SqlAlchemySession(SqlWrapperSession):
             })
         self._connection.execute(stmt)
 
+    def _flush_updates(self, table_names=None, exclude=None):
+        """Execute the buffered updates.
+
+        Args:
+            table_names (Iterable[str], optional): Only execute the updates
+                that involve these tables. Defaults to None (all tables).
+            exclude (Tuple, optional): Keep the updates buffered under this
+                key, used to keep batching updates of the same shape.
+                Defaults to None.
+        """
+        if table_names is not None:
+            table_names = set(table_names)
+        for key in list(self._update_buffer.keys()):
+            condition, tables, rows = self._update_buffer[key]
+            if key != exclude and (table_names is None
+                                   or tables & table_names):
+                del self._update_buffer[key]
+                self._batch_update(key[0], key[1], key[2], condition, rows)
+
+    def _batch_update(self, table_name, columns, shape, condition, rows):
+        """Execute updates of the same shape in as few statements as possible.
+
+        Updates whose condition only compares columns of the updated table
+        to values are delegated to the dialect. Other conditions are
+        executed as one statement with many parameter sets.
+
+        Args:
+            table_name (str): The name of the table to update.
+            columns (Tuple[str]): The columns to set.
+            shape (Tuple): The shape of the conditions of the updates.
+            condition (Condition): The condition of one of the updates.
+            rows (List[List[Any]]): The values of the columns, followed
+                by the values of the condition, for each update.
+        """
+        table = self._get_sqlalchemy_table(table_name)
+        where_columns = self._get_equality_columns(table_name, shape)
+        if where_columns is not None:
+            self._dialect.update(self._connection, table, list(columns),
+                                 where_columns, rows)
+            return
+        params = list()
+        where = self._get_sqlalchemy_condition(condition, params=params)
+        names = ["osp_set_%s" % i for i in range(len(columns))]
+        stmt = table.update().where(where).values({
+            c: sqlalchemy.bindparam(n) for c, n in zip(columns, names)
+        })
+        self._connection.execute(stmt, [dict(zip(names + params, row))
+                                        for row in rows])
+
     # OVERRIDE
     def _db_delete(self, table_name, condition):
+        shape, values = self._get_condition_shape(condition)
+        columns = self._get_equality_columns(table_name, shape)
+        if self._write_buffer and self._transaction is not None \
+                and columns is not None and len(columns) == 1:
+            self._flush_inserts([table_name])
+            self._flush_updates([table_name])
+            self._delete_buffer.setdefault(
+                (table_name, columns[0]), []
+            ).append(values[0])
+            return
+        self._flush_writes([table_name])
         table = self._get_sqlalchemy_table(table_name)
         condition = self._get_sqlalchemy_condition(condition)
         stmt = table.delete() \
             .where(condition)
         self._connection.execute(stmt)
 
+    def _flush_deletes(self, table_names=None):
+        """Execute the buffered deletes as DELETE ... WHERE ... IN.
+
+        The values are split into chunks, such that the number of bind
+        parameters of a statement does not exceed the limit of the dialect.
+
+        Args:
+            table_names (Iterable[str], optional): Only execute the deletes
+                buffered for these tables. Defaults to None (all tables).
+        """
+        if table_names is not None:
+            table_names = set(table_names)
+        for key in list(self._delete_buffer.keys()):
+            table_name, column = key
+            if table_names is not None and table_name not in table_names:
+                continue
+            values = list(dict.fromkeys(self._delete_buffer.pop(key)))
+            table = self._get_sqlalchemy_table(table_name)
+            batch_size = self._dialect.max_bind_params
+            for i in range(0, len(values), batch_size):
+                self._connection.execute(table.delete().where(
+                    table.c[column].in_(values[i:i + batch_size])
+                ))
+
     # OVERRIDE
     def _get_table_names(self, prefix):
         return set(filter(lambda x: x.startswith(prefix),
-                          self._metadata.tables.keys()))
+                          self._table_names))
+
+    def _get_condition_shape(self, condition):
+        """Split the given condition into its structure and its values.
+
+        The sub-conditions of an AndCondition or OrCondition are sorted,
+        such that equivalent conditions have the same shape and their values
+        are listed in the same order. The values of an InCondition are a
+        single value, bound to an expanding bind parameter. The operator of
+        a ComparisonCondition is part of the shape.
+
+        :param condition: The condition to split
+        :type condition: Condition
+        :raises NotImplementedError: Unknown condition type.
+        :return: The hashable shape of the condition and its values.
+        :rtype: Tuple[Tuple, List[Any]]
+        """
+        if condition is None:
+            return None, []
+        if isinstance(condition, JoinCondition):
+            return ("join", condition.table_name1, condition.column1,
+                    condition.table_name2, condition.column2), []
+        if isinstance(condition, InCondition):
+            return ("in", condition.table_name, condition.column), \
+                [list(condition.values)]
+        if isinstance(condition, ComparisonCondition):
+            return ("cmp", condition.table_name, condition.column,
+                    condition.operator), [condition.value]
+        if isinstance(condition, RangeCondition):
+            return ("range", condition.table_name, condition.column), \
+                [condition.lower, condition.upper]
+        if isinstance(condition, LikeCondition):
+            return ("like", condition.table_name, condition.column), \
+                [condition.value]
+        if self._is_null_condition(condition):
+            return ("null", condition.table_name, condition.column), []
+        if isinstance(condition, EqualsCondition):
+            return ("eq", condition.table_name, condition.column), \
+                [condition.value]
+        if isinstance(condition, (AndCondition, OrCondition)):
+            parts = self._sorted_conditions(condition.conditions)
+            kind = "and" if isinstance(condition, AndCondition) else "or"
+            return (kind, tuple(shape for _, shape, _ in parts)), \
+                [v for _, _, values in parts for v in values]
+
+        raise NotImplementedError("Unsupported condition")
+
+    def _get_equality_columns(self, table_name, shape):
+        """Get the columns of a condition that only checks for equality.
+
+        :param table_name: The name of the table the columns must belong to.
+        :type table_name: str
+        :param shape: The shape of a condition, see _get_condition_shape.
+        :type shape: Tuple
+        :return: The columns compared to values, in the order of the values
+            of the condition, or None if the condition has another form.
+        :rtype: List[str]
+        """
+        if shape is None:
+            return None
+        parts = shape[1] if shape[0] == "and" else [shape]
+        if parts and all(p[0] == "eq" and p[1] == table_name
+                         for p in parts):
+            return [p[2] for p in parts]
+        return None
+
+    def _get_shape_tables(self, shape):
+        """Get the names of the tables referenced in a condition shape.
+
+        :param shape: The shape of a condition, see _get_condition_shape.
+        :type shape: Tuple
+        :return: The names of the tables.
+        :rtype: Set[str]
+        """
+        if shape is None:
+            return set()
+        if shape[0] in ("eq", "in", "cmp", "range", "like", "null"):
+            return {shape[1]}
+        if shape[0] == "join":
+            return {shape[1], shape[3]}
+        return set().union(*map(self._get_shape_tables, shape[1]))
+
+    def _get_shape_columns(self, table_name, shape):
+        """Get the columns of a table referenced in a condition shape.
+
+        :param table_name: The name of the table.
+        :type table_name: str
+        :param shape: The shape of a condition, see _get_condition_shape.
+        :type shape: Tuple
+        :return: The names of the columns.
+        :rtype: Set[str]
+        """
+        if shape is None:
+            return set()
+        if shape[0] in ("and", "or"):
+            return set().union(*(self._get_shape_columns(table_name, s)
+                                 for s in shape[1]))
+        if shape[0] == "join":
+            return {c for t, c in (shape[1:3], shape[3:5])
+                    if t == table_name}
+        return {shape[2]} if shape[1] == table_name else set()
+
+    def _sorted_conditions(self, conditions):
+        """Sort the given conditions by their shape.
+
+        :param conditions: The conditions to sort.
+        :type conditions: Iterable[Condition]
+        :return: The conditions with their shape and values, sorted by shape.
+        :rtype: List[Tuple[Condition, Tuple, List[Any]]]
+        """
+        parts = [(c, *self._get_condition_shape(c)) for c in conditions]
+        return sorted(parts, key=lambda x: str(x[1]))
 
-    def _get_sqlalchemy_condition(self, condition, tables=None):
+    @staticmethod
+    def _is_null_condition(condition):
+        """Check whether a condition only holds for NULL values.
+
+        That is an IsNullCondition or an EqualsCondition with the value
+        None, as column = NULL is never true.
+
+        :param condition: The condition to check.
+        :type condition: Condition
+        :return: Whether the condition is an IS NULL condition.
+        :rtype: bool
+        """
+        return isinstance(condition, EqualsCondition) \
+            and not isinstance(condition, (ComparisonCondition,
+                                           RangeCondition, LikeCondition)) \
+            and condition.value is None
+
+    def _get_sqlalchemy_condition(self, condition, tables=None, params=None):
         """Transform the given condition to a SqlAlchemy condition.
 
         :param condition: The condition to transform
-        :type condition: Union[AndCondition, EqualsCondition]
+        :type condition: Condition
+        :param tables: Maps the table names in the condition to the tables
+            (or aliases) to use.
+        :type tables: Dict[str, Table]
+        :param params: If given, the values are replaced by bind parameters,
+            whose names are appended to this list. The values are bound
+            in the order given by _get_condition_shape.
+        :type params: List[str]
         :raises NotImplementedError: Unknown condition type.
         :return: SqlAlchemy condition.
         :rtype: expression
@@ -154,22 +2104,65 @@ class SqlAlchemySession(SqlWrapperSession):
             column1 = getattr(table1.c, condition.column1)
             column2 = getattr(table2.c, condition.column2)
             return column1 == column2
+        if isinstance(condition, InCondition):
+            column = self._get_condition_column(condition, tables)
+            if params is not None:
+                params.append("osp_%s" % len(params))
+                return column.in_(
+                    sqlalchemy.bindparam(params[-1], expanding=True)
+                )
+            return column.in_(condition.values)
+        if self._is_null_condition(condition):
+            return self._get_condition_column(condition, tables).is_(None)
         if isinstance(condition, EqualsCondition):
-            value = condition.value
-            if tables:
-                table = tables[condition.table_name]
-            else:
-                table = self._get_sqlalchemy_table(condition.table_name)
-            column = getattr(table.c, condition.column)
-            return column == value
-        if isinstance(condition, AndCondition):
-            return sqlalchemy.sql.and_(
-                *[self._get_sqlalchemy_condition(c, tables)
-                  for c in condition.conditions]
+            column = self._get_condition_column(condition, tables)
+            values = list(condition.value) \
+                if isinstance(condition, RangeCondition) \
+                else [condition.value]
+            if params is not None:
+                names = ["osp_%s" % (len(params) + i)
+                         for i in range(len(values))]
+                params.extend(names)
+                values = [sqlalchemy.bindparam(n) for n in names]
+            if isinstance(condition, ComparisonCondition):
+                return column.op(condition.operator,
+                                 is_comparison=True)(values[0])
+            if isinstance(condition, RangeCondition):
+                return column.between(*values)
+            if isinstance(condition, LikeCondition):
+                return column.like(values[0])
+            return column == values[0]
+        if isinstance(condition, (AndCondition, OrCondition)):
+            conditions = condition.conditions
+            if params is not None:
+                conditions = [c for c, _, _ in
+                              self._sorted_conditions(conditions)]
+            func = sqlalchemy.sql.and_ \
+                if isinstance(condition, AndCondition) else sqlalchemy.sql.or_
+            return func(
+                *[self._get_sqlalchemy_condition(c, tables, params)
+                  for c in conditions]
             )
 
         raise NotImplementedError("Unsupported condition")
 
+    def _get_condition_column(self, condition, tables=None):
+        """Get the SqlAlchemy column a condition refers to.
+
+        :param condition: A condition on a single column.
+        :type condition: EqualsCondition
+        :param tables: Maps the table names in the condition to the tables
+            (or aliases) to use.
+        :type tables: Dict[str, Table]
+        :return: The column.
+        :rtype: Column
+        """
+        if tables:
+            table = tables[condition.table_name]
+        else:
+            table = self._get_sqlalchemy_table(condition.table_name)
+        return getattr(table.c, condition.column)
+
     def _to_sqlalchemy_datatype(self, rdflib_datatype):
         """Convert the given Cuds datatype to a datatype of sqlalchemy.
 
@@ -181,8 +2174,12 @@ class SqlAlchemySession(SqlWrapperSession):
         """
         if rdflib_datatype is None:
             return sqlalchemy.String()
+        if rdflib_datatype == "UID" and self._binary_uids:
+            return BinaryUid()
         if rdflib_datatype == "UID":
             return sqlalchemy.String(36)
+        if is_vector_datatype(rdflib_datatype):
+            return PackedVector(rdflib_datatype)
         if rdflib_datatype == rdflib.XSD.integer:
             return sqlalchemy.Integer
         if rdflib_datatype == rdflib.XSD.boolean:
@@ -208,7 +2205,10 @@ class SqlAlchemySession(SqlWrapperSession):
         """
         if table_name in self._metadata.tables:
             return self._metadata.tables[table_name]
-        return sqlalchemy.Table(table_name,
-                                self._metadata,
-                                autoload=True,
-                                autoload_with=self._connection)
+        table = sqlalchemy.Table(table_name,
+                                 self._metadata,
+                                 autoload=True,
+                                 autoload_with=self._connection)
+        if "o" in table.c and self._is_packed_vector_table(table_name):
+            table.c.o.type = PackedVector(determine_datatype(table_name))
+        return table
@@ -0,0 +1,74 @@
+"""Compact storage of the uids of the CUDS objects."""
+
+import uuid
+import sqlalchemy
+from sqlalchemy.dialects import mysql, postgresql
+
+
+class BinaryUid(sqlalchemy.types.TypeDecorator):
+    """Store uids as native UUID on PostgreSQL and as 16 bytes elsewhere.
+
+    Values are bound and returned as strings, like the uids stored in a
+    String(36) column.
+    """
+
+    impl = sqlalchemy.LargeBinary(16)
+
+    def load_dialect_impl(self, dialect):
+        """Get the column type for the given dialect.
+
+        Args:
+            dialect (Dialect): The SqlAlchemy dialect.
+
+        Returns:
+            TypeEngine: The type of the column.
+        """
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(postgresql.UUID())
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(mysql.BINARY(16))
+        return dialect.type_descriptor(sqlalchemy.LargeBinary(16))
+
+    def process_bind_param(self, value, dialect):
+        """Convert a uid to the value stored in the database.
+
+        Args:
+            value (Union[str, UUID]): The uid.
+            dialect (Dialect): The SqlAlchemy dialect.
+
+        Returns:
+            Union[str, bytes]: The value to store.
+        """
+        if value is None:
+            return None
+        if dialect.name == "postgresql":
+            return str(value)
+        return uuid.UUID(str(value)).bytes
+
+    def process_result_value(self, value, dialect):
+        """Convert a stored value to a uid.
+
+        Args:
+            value (Union[str, bytes, UUID]): The stored value.
+            dialect (Dialect): The SqlAlchemy dialect.
+
+        Returns:
+            str: The uid.
+        """
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return str(uuid.UUID(bytes=bytes(value)))
+        return str(value)
+
+
+def is_binary_uid_type(column_type):
+    """Check whether the given column type stores uids in binary form.
+
+    Args:
+        column_type (TypeEngine): The type of a (reflected) uid column.
+
+    Returns:
+        bool: False for string columns, True otherwise.
+    """
+    return not isinstance(column_type, sqlalchemy.String)
@@ -0,0 +1,191 @@
+"""Storage of vectors in a single column.
+
+By default, osp-core stores each element of a vector in its own column
+(o___0, o___1, ...). PackedVector stores the whole vector in the column of
+the vector instead. The queries of osp-core still refer to the element
+columns, use :func:`pack_vector_columns` and :func:`pack_vector_condition`
+to translate them.
+"""
+
+import numpy as np
+import sqlalchemy
+from sqlalchemy.dialects import postgresql
+from osp.core.ontology.datatypes import _parse_vector_args, \
+    get_python_datatype
+from osp.core.session.db.sql_util import AndCondition, EqualsCondition, \
+    VEC_PREFIX
+from osp.wrappers.sqlalchemy.conditions import OrCondition
+
+
+class PackedVector(sqlalchemy.types.TypeDecorator):
+    """Store vectors as ARRAY on PostgreSQL and as packed binary elsewhere.
+
+    The binary form contains the elements in little-endian byte order.
+    Values are bound as numpy arrays or flat lists and returned as numpy
+    arrays of the shape of the datatype.
+    """
+
+    impl = sqlalchemy.LargeBinary
+
+    def __init__(self, datatype):
+        """Initialize the type.
+
+        Args:
+            datatype (str): The vector datatype, e.g. VECTOR-INT-2-2.
+        """
+        super().__init__()
+        self.datatype = str(datatype)
+        self.element_datatype, self.shape = _parse_vector_args(
+            self.datatype[len(VEC_PREFIX):].split("-")
+        )
+        self.size = int(np.prod(self.shape))
+        self.dtype = get_python_datatype(self.element_datatype)[2]
+        self.stored_dtype = self.dtype.newbyteorder("<")
+
+    def load_dialect_impl(self, dialect):
+        """Get the column type for the given dialect.
+
+        Args:
+            dialect (Dialect): The SqlAlchemy dialect.
+
+        Returns:
+            TypeEngine: The type of the column.
+        """
+        if dialect.name == "postgresql":
+            element_type = sqlalchemy.Float
+            if self.dtype.kind == "i":
+                element_type = sqlalchemy.BigInteger
+            return dialect.type_descriptor(postgresql.ARRAY(element_type))
+        return dialect.type_descriptor(sqlalchemy.LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        """Convert a vector to the value stored in the database.
+
+        Args:
+            value (Union[np.ndarray, List]): The vector.
+            dialect (Dialect): The SqlAlchemy dialect.
+
+        Raises:
+            ValueError: The vector does not have the size of the datatype.
+
+        Returns:
+            Union[List, bytes]: The value to store.
+        """
+        if value is None:
+            return None
+        array = np.asarray(value, dtype=self.dtype).reshape(-1)
+        if array.size != self.size:
+            raise ValueError("Expected %s elements for %s, got %s"
+                             % (self.size, self.datatype, array.size))
+        if dialect.name == "postgresql":
+            return array.tolist()
+        return array.astype(self.stored_dtype).tobytes()
+
+    def process_result_value(self, value, dialect):
+        """Convert a stored value to a vector.
+
+        Args:
+            value (Union[List, bytes]): The stored value.
+            dialect (Dialect): The SqlAlchemy dialect.
+
+        Returns:
+            np.ndarray: The vector.
+        """
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            array = np.frombuffer(bytes(value), dtype=self.stored_dtype)
+        else:
+            array = np.asarray(value)
+        return array.astype(self.dtype).reshape(self.shape)
+
+    def stack(self, values):
+        """Convert many stored values to a single array.
+
+        Args:
+            values (Sequence[Union[List, bytes]]): The stored values, as
+                returned by the dialect implementation of this type. None
+                for missing vectors.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The vectors stacked along a new
+                first axis and whether each vector is missing. Missing
+                vectors are filled with zeros.
+        """
+        missing = np.fromiter((v is None for v in values), dtype=bool,
+                              count=len(values))
+        present = [v for v in values if v is not None]
+        if present and isinstance(present[0],
+                                  (bytes, bytearray, memoryview)):
+            blank = bytes(self.size * self.stored_dtype.itemsize)
+            array = np.frombuffer(
+                b"".join(blank if v is None else bytes(v) for v in values),
+                dtype=self.stored_dtype
+            ).astype(self.dtype)
+        else:
+            blank = [0] * self.size
+            array = np.array([blank if v is None else v for v in values],
+                             dtype=self.dtype)
+        return array.reshape(len(values), *self.shape), missing
+
+
+def is_vector_datatype(datatype):
+    """Check whether the given datatype is a vector.
+
+    Args:
+        datatype (str): The datatype.
+
+    Returns:
+        bool: Whether the datatype is a vector.
+    """
+    return datatype is not None and str(datatype).startswith(VEC_PREFIX)
+
+
+def pack_vector_columns(columns):
+    """Replace the element columns of vectors by the column of the vector.
+
+    Args:
+        columns (List[str]): The columns, as expanded by osp-core.
+
+    Returns:
+        List[str]: The columns with one column per vector.
+    """
+    return list(dict.fromkeys(c.split("___")[0] for c in columns))
+
+
+def pack_vector_condition(condition, tables):
+    """Replace conditions on the elements of vectors by one condition.
+
+    osp-core expands a condition on a vector into an AndCondition with a
+    condition for each element. For the given tables, these conditions
+    are combined into a condition on the column of the vector again.
+
+    Args:
+        condition (Condition): The condition to pack.
+        tables (Dict[str, Dict[str, str]]): Maps the tables (or aliases)
+            that store vectors in a single column to the datatypes of
+            their columns.
+
+    Returns:
+        Condition: The packed condition.
+    """
+    if isinstance(condition, OrCondition):
+        return OrCondition(*[pack_vector_condition(c, tables)
+                             for c in condition.conditions])
+    if not isinstance(condition, AndCondition):
+        return condition
+    conditions, elements = list(), dict()
+    for c in condition.conditions:
+        if isinstance(c, EqualsCondition) and c.table_name in tables \
+                and "___" in c.column:
+            column, i = c.column.split("___")
+            elements.setdefault((c.table_name, column), {})[int(i)] = c.value
+        else:
+            conditions.append(pack_vector_condition(c, tables))
+    for (table_name, column), values in elements.items():
+        datatype = tables[table_name][column]
+        conditions.append(EqualsCondition(
+            table_name, column,
+            np.array([values[i] for i in sorted(values)]), datatype
+        ))
+    return AndCondition(*conditions)
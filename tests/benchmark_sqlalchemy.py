@@ -0,0 +1,321 @@
+"""Benchmark the SqlAlchemy wrapper with the city ontology."""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import sqlalchemy
+from osp.wrappers.sqlalchemy import SqlAlchemySession
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ("commit_new", "commit_update", "load_by_oclass", "refresh",
+              "prune", "clear_database")
+# The minimum number of samples needed for each reported percentile.
+# Fewer samples only report the minimum and the median.
+TAIL_PERCENTILES = {90: 10, 99: 100}
+
+
+def get_city_namespace():
+    """Get the namespace of the city ontology.
+
+    Returns:
+        OntologyNamespace: The city namespace.
+    """
+    try:
+        from osp.core.namespaces import city
+    except ImportError:
+        from osp.core.ontology import Parser
+        from osp.core.namespaces import _namespace_registry
+        Parser(_namespace_registry._graph).parse("city")
+        _namespace_registry.update_namespaces()
+        city = _namespace_registry.city
+    return city
+
+
+def generate_city(city, size):
+    """Generate a city with the given number of citizens.
+
+    For every 100 citizens, the city has a neighborhood with a street and
+    a building.
+
+    Args:
+        city (OntologyNamespace): The city namespace.
+        size (int): The number of citizens.
+
+    Returns:
+        Tuple[Cuds, List[Cuds]]: The city and its citizens.
+    """
+    c = city.City(name="Freiburg", coordinates=[0, 0])
+    citizens = [city.Citizen(name="Citizen %s" % i, age=i % 100)
+                for i in range(size)]
+    c.add(*citizens, rel=city.hasInhabitant)
+    for i in range(max(1, size // 100)):
+        n = c.add(city.Neighborhood(name="Neighborhood %s" % i,
+                                    coordinates=[i, i]))
+        s = n.add(city.Street(name="Street %s" % i, coordinates=[i, 0]))
+        s.add(city.Building(name="Building %s" % i))
+    return c, citizens
+
+
+def percentile(samples, q):
+    """Compute the q-th percentile of the samples.
+
+    Args:
+        samples (List[float]): The samples.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile, interpolated linearly between samples.
+    """
+    samples = sorted(samples)
+    pos = (len(samples) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(samples) - 1)
+    return samples[lower] + (samples[upper] - samples[lower]) * (pos - lower)
+
+
+def summarize(samples, items, peak_memory):
+    """Compute the statistics of the samples of one operation.
+
+    Args:
+        samples (List[float]): The durations of the operation in seconds.
+        items (int): The number of CUDS objects processed per operation.
+        peak_memory (List[int]): The peak memory in bytes of each sample.
+
+    Returns:
+        Dict[str, Any]: The statistics. The percentiles in
+            TAIL_PERCENTILES are only given for enough samples.
+    """
+    median = percentile(samples, 50)
+    stats = {
+        "samples": samples,
+        "items": items,
+        "throughput": items / median if median else None,
+        "min": min(samples),
+        "p50": median,
+        "peak_memory": max(peak_memory) if peak_memory else None
+    }
+    for q, min_samples in TAIL_PERCENTILES.items():
+        if len(samples) >= min_samples:
+            stats["p%s" % q] = percentile(samples, q)
+    return stats
+
+
+class Measurement:
+    """Measure the duration and the peak memory of a block of code."""
+
+    def __init__(self, measure_memory=True):
+        """Initialize the measurement.
+
+        Args:
+            measure_memory (bool): Whether to trace the memory allocations.
+        """
+        self.measure_memory = measure_memory
+        self.duration = None
+        self.peak_memory = None
+
+    def __enter__(self):
+        """Start the measurement."""
+        if self.measure_memory:
+            tracemalloc.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        """Stop the measurement."""
+        self.duration = time.perf_counter() - self._start
+        if self.measure_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+def clear_database(url, **session_kwargs):
+    """Delete all CUDS objects from the database with the given URL.
+
+    Args:
+        url (str): The SqlAlchemy URL of the database.
+        **session_kwargs: Passed to the SqlAlchemySession.
+    """
+    city = get_city_namespace()
+    with SqlAlchemySession(url, **session_kwargs) as session:
+        city.CityWrapper(session=session)
+        session._clear_database()
+
+
+def run_round(url, size, measure_memory=True, **session_kwargs):
+    """Run all operations once on the database with the given URL.
+
+    Args:
+        url (str): The SqlAlchemy URL of an empty database.
+        size (int): The number of citizens in the city.
+        measure_memory (bool): Whether to measure the peak memory.
+        **session_kwargs: Passed to the SqlAlchemySession.
+
+    Returns:
+        Dict[str, Tuple[float, int, int]]: Maps the operations to their
+            duration, the number of processed CUDS objects and the peak
+            memory.
+    """
+    city = get_city_namespace()
+    c, citizens = generate_city(city, size)
+    result = dict()
+
+    def measure(operation, items, func):
+        with Measurement(measure_memory) as m:
+            func()
+        result[operation] = (m.duration, items, m.peak_memory)
+
+    with SqlAlchemySession(url, **session_kwargs) as session:
+        wrapper = city.CityWrapper(session=session)
+        cw = wrapper.add(c)
+        n_objects = len(session._registry) - 1
+        measure("commit_new", n_objects, session.commit)
+
+        for citizen in cw.get(oclass=city.Citizen):
+            citizen.age += 1
+        measure("commit_update", size, session.commit)
+
+    with SqlAlchemySession(url, **session_kwargs) as session:
+        wrapper = city.CityWrapper(session=session)
+        loaded = list()
+        measure("load_by_oclass", size,
+                lambda: loaded.extend(session.load_by_oclass(city.Citizen)))
+
+        session.expire_all()
+        measure("refresh", size, lambda: session.refresh(*loaded))
+
+    with SqlAlchemySession(url, **session_kwargs) as session:
+        wrapper = city.CityWrapper(session=session)
+        cw = wrapper.get(c.uid)
+        removed = [x.uid for x in citizens[::2]]
+        cw.get(*removed)
+
+        def prune():
+            cw.remove(*removed)
+            session.prune()
+            session.commit()
+        measure("prune", len(removed), prune)
+
+    with SqlAlchemySession(url, **session_kwargs) as session:
+        wrapper = city.CityWrapper(session=session)
+        measure("clear_database", n_objects - len(removed),
+                session._clear_database)
+    return result
+
+
+def run_benchmark(url=None, size=1000, repeat=3, measure_memory=True,
+                  **session_kwargs):
+    """Run the benchmark.
+
+    Args:
+        url (str): The SqlAlchemy URL of the database to use. The database
+            is cleared before the first round and in each round. Defaults
+            to None (a temporary SQLite file for each round).
+        size (int): The number of citizens in the generated city.
+        repeat (int): The number of rounds.
+        measure_memory (bool): Whether to measure the peak memory. Since
+            tracing the memory allocations slows down the operations, the
+            memory is measured in an additional round that is not timed.
+        **session_kwargs: Passed to the SqlAlchemySession.
+
+    Returns:
+        Dict[str, Any]: The description of the benchmark and the statistics
+            of each operation.
+    """
+    samples = {op: list() for op in OPERATIONS}
+    items, memory = dict(), {op: list() for op in OPERATIONS}
+    rounds = [False] * repeat + ([True] if measure_memory else [])
+    if url is not None:
+        clear_database(url, **session_kwargs)
+    for trace_memory in rounds:
+        tmp_dir = None
+        round_url = url
+        if url is None:
+            tmp_dir = tempfile.mkdtemp()
+            round_url = "sqlite:///" + os.path.join(tmp_dir, "benchmark.db")
+        try:
+            result = run_round(round_url, size, trace_memory,
+                               **session_kwargs)
+        finally:
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir)
+        for op, (duration, n, peak_memory) in result.items():
+            items[op] = n
+            if trace_memory:
+                memory[op].append(peak_memory)
+            else:
+                samples[op].append(duration)
+
+    return {
+        "benchmark": {
+            "url": repr(sqlalchemy.engine.url.make_url(url)) if url
+            else "sqlite (temporary file)",
+            "size": size,
+            "repeat": repeat,
+            "session_kwargs": {k: str(v) for k, v in session_kwargs.items()},
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": {
+            op: summarize(samples[op], items[op], memory[op])
+            for op in OPERATIONS
+        }
+    }
+
+
+def benchmark_from_terminal():
+    """Run the benchmark from the terminal."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the SqlAlchemy wrapper with the city "
+                    "ontology."
+    )
+    parser.add_argument("--url", type=str, action="append",
+                        help="The sqlalchemy url of a database to use. "
+                             "The database will be cleared. Can be given "
+                             "multiple times. Uses a temporary SQLite "
+                             "database by default.")
+    parser.add_argument("--size", type=int, default=1000,
+                        help="The number of citizens in the city.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="The number of rounds.")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Do not measure the peak memory.")
+    parser.add_argument("--output", type=str, default="benchmark.json",
+                        help="The JSON file to write the results to.")
+    parser.add_argument("--log-level", default="INFO", type=str.upper,
+                        help="Set the logging level")
+    args = parser.parse_args()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(getattr(logging, args.log_level))
+    logging.getLogger("osp.wrappers").setLevel(
+        getattr(logging, args.log_level))
+
+    results = list()
+    for url in args.url or [None]:
+        try:
+            results.append(run_benchmark(url, args.size, args.repeat,
+                                         not args.no_memory))
+        except sqlalchemy.exc.OperationalError as e:
+            logger.error("Skipping unavailable database %s: %s"
+                         % (url, e))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    for result in results:
+        logger.info(result["benchmark"]["url"])
+        for op, stats in result["results"].items():
+            logger.info("  %-15s p50 %8.3fs  %10.1f items/s" % (
+                op, stats["p50"], stats["throughput"] or 0))
+
+
+if __name__ == "__main__":
+    benchmark_from_terminal()
@@ -0,0 +1,74 @@
+"""Test the benchmark of the SqlAlchemy wrapper."""
+
+import os
+import shutil
+import tempfile
+import unittest2 as unittest
+from osp.wrappers.sqlalchemy import SqlAlchemySession
+from tests.benchmark_sqlalchemy import run_benchmark, summarize, \
+    clear_database, get_city_namespace, OPERATIONS, percentile
+
+
+class TestSqlAlchemyBenchmark(unittest.TestCase):
+    """Test the benchmark of the SqlAlchemy wrapper."""
+
+    def test_percentile(self):
+        """Test computing percentiles."""
+        self.assertEqual(percentile([3, 1, 2], 50), 2)
+        self.assertEqual(percentile([1, 2], 50), 1.5)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 100), 5)
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_run_benchmark(self):
+        """Test running the benchmark on a temporary sqlite database."""
+        result = run_benchmark(size=10, repeat=2)
+        self.assertEqual(result["benchmark"]["size"], 10)
+        self.assertEqual(set(result["results"].keys()), set(OPERATIONS))
+        for stats in result["results"].values():
+            self.assertEqual(len(stats["samples"]), 2)
+            self.assertLessEqual(stats["min"], stats["p50"])
+            self.assertNotIn("p90", stats)
+            self.assertNotIn("p99", stats)
+            self.assertGreater(stats["peak_memory"], 0)
+        self.assertEqual(result["results"]["load_by_oclass"]["items"], 10)
+        self.assertEqual(result["results"]["prune"]["items"], 5)
+
+    def test_summarize(self):
+        """Test that percentiles are only given for enough samples."""
+        stats = summarize([3, 1, 2], 10, [])
+        self.assertEqual((stats["min"], stats["p50"]), (1, 2))
+        self.assertEqual(stats["throughput"], 5)
+        self.assertIsNone(stats["peak_memory"])
+        self.assertNotIn("p90", stats)
+        self.assertNotIn("p99", stats)
+
+        stats = summarize(list(range(11)), 10, [1, 2])
+        self.assertEqual(stats["p90"], 9)
+        self.assertEqual(stats["peak_memory"], 2)
+        self.assertNotIn("p99", stats)
+
+        stats = summarize(list(range(101)), 10, [])
+        self.assertEqual(stats["p99"], 99)
+
+    def test_clear_database(self):
+        """Test that a given database is cleared before the first round."""
+        city = get_city_namespace()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        url = "sqlite:///" + os.path.join(tmp_dir, "benchmark.db")
+        with SqlAlchemySession(url) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(city.City(name="Paris"))
+            session.commit()
+
+        clear_database(url)
+        with SqlAlchemySession(url) as session:
+            wrapper = city.CityWrapper(session=session)
+            self.assertEqual(wrapper.get(), [])
+
+        result = run_benchmark(url, size=10, repeat=1, measure_memory=False)
+        self.assertEqual(result["results"]["load_by_oclass"]["items"], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
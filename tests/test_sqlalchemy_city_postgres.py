@@ -1,10 +1,22 @@
 """Test the Sqlite Wrapper with the CITY ontology."""
 
 import os
+import json
+import tempfile
 import uuid
 import unittest2 as unittest
+import numpy as np
 import sqlalchemy
-from osp.wrappers.sqlalchemy import SqlAlchemySession
+import rdflib
+from unittest import mock
+from osp.core.session.db.sql_util import AndCondition, \
+    EqualsCondition, SqlQuery
+from osp.wrappers.sqlalchemy import SqlAlchemySession, engines
+from osp.wrappers.sqlalchemy.conditions import ComparisonCondition, \
+    InCondition, IsNullCondition, OrCondition, RangeCondition, where
+from osp.wrappers.sqlalchemy.migrate import migrate_uid_storage
+from osp.wrappers.sqlalchemy.schema_cache import get_schema_cache_path
+from osp.wrappers.sqlalchemy.uids import BinaryUid
 
 try:
     from osp.core.namespaces import city
@@ -314,6 +326,1159 @@ class TestSqliteCityPostgres(unittest.TestCase):
                 ])
                 session1.commit()
 
+    def test_insert_batched(self):
+        """Test that the inserts of a commit are written in batches."""
+        c = city.City(name="Freiburg")
+        citizens = [city.Citizen(name="Citizen %s" % i) for i in range(50)]
+        c.add(*citizens, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            statements = list()
+            sqlalchemy.event.listen(
+                session._connection, "before_cursor_execute",
+                lambda conn, cursor, stmt, *args: statements.append(stmt)
+            )
+            session.commit()
+
+        inserts = [x for x in statements if x.startswith("INSERT")
+                   and "INTO \"%s\"" % RELATIONSHIP_TABLE in x]
+        self.assertTrue(inserts)
+        self.assertLess(len(inserts), 5)
+
+        engine = sqlalchemy.create_engine(URL)
+        with engine.connect() as conn:
+            metadata = sqlalchemy.MetaData(conn)
+            metadata.reflect(engine)
+            tbl = metadata.tables[RELATIONSHIP_TABLE]
+            stmt = sqlalchemy.select([sqlalchemy.func.count()]) \
+                .select_from(tbl)
+            self.assertEqual(conn.execute(stmt).scalar(), 2 * 50 + 2)
+            tbl = metadata.tables[data_tbl("XSD_string")]
+            stmt = sqlalchemy.select([sqlalchemy.func.count()]) \
+                .select_from(tbl)
+            self.assertEqual(conn.execute(stmt).scalar(), 51)
+
+    def test_insert_duplicates(self):
+        """Test that inserting existing triples raises no error."""
+        c = city.City(name="Freiburg")
+        p1 = city.Citizen(name="Peter")
+        p2 = city.Citizen(name="Georg")
+        c.add(p1, p2, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            cw = wrapper.add(c)
+            session.commit()
+
+            errors = list()
+            sqlalchemy.event.listen(session._connection, "handle_error",
+                                    errors.append)
+            session._init_transaction()
+            session._add(*session._substitute_root_iri(cw.get_triples()))
+            session._commit()
+            self.assertEqual(errors, list())
+
+        check_state(self, c, p1, p2)
+
+    def test_statement_cache(self):
+        """Test that compiled select statements are reused."""
+        c = city.City(name="Freiburg")
+        p1 = city.Citizen(name="Peter")
+        p2 = city.Citizen(name="Anna")
+        c.add(p1, p2, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        with SqlAlchemySession(URL, statement_cache_size=8) as session:
+            wrapper = city.CityWrapper(session=session)
+            cw = wrapper.get(c.uid)
+            p1w, p2w = cw.get(p1.uid, p2.uid)
+            self.assertEqual(p1w.name, "Peter")
+            self.assertEqual(p2w.name, "Anna")
+            info = session.statement_cache_info()
+            self.assertGreater(info["hits"], 0)
+            self.assertGreater(info["misses"], 0)
+            self.assertLessEqual(info["size"], 8)
+            self.assertEqual(info["maxsize"], 8)
+
+        with SqlAlchemySession(URL, statement_cache_size=0) as session:
+            wrapper = city.CityWrapper(session=session)
+            self.assertEqual(wrapper.get(c.uid).name, "Freiburg")
+            info = session.statement_cache_info()
+            self.assertEqual(info["hits"], 0)
+            self.assertEqual(info["size"], 0)
+
+    def test_lazy_reflection(self):
+        """Test that the data tables are reflected on first use."""
+        c = city.City(name="Freiburg")
+        p1 = city.Citizen(name="Peter", age=42)
+        c.add(p1, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        with SqlAlchemySession(URL) as session:
+            self.assertEqual(set(session._metadata.tables.keys()), {
+                CUDS_TABLE, ENTITIES_TABLE, TYPES_TABLE, NAMESPACES_TABLE,
+                RELATIONSHIP_TABLE
+            })
+            self.assertEqual(session._get_table_names(DATA_TABLE_PREFIX), {
+                data_tbl("VECTOR-INT-2"), data_tbl("XSD_boolean"),
+                data_tbl("XSD_float"), data_tbl("XSD_integer"),
+                data_tbl("XSD_string")
+            })
+            wrapper = city.CityWrapper(session=session)
+            p1w = wrapper.get(c.uid).get(p1.uid)
+            self.assertEqual(p1w.name, "Peter")
+            self.assertEqual(p1w.age, 42)
+            self.assertIn(data_tbl("XSD_integer"), session._metadata.tables)
+
+    def test_schema_cache(self):
+        """Test storing the reflected schema in a cache file."""
+        c = city.City(name="Freiburg")
+        p1 = city.Citizen(name="Peter", age=42)
+        c.add(p1, rel=city.hasInhabitant)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with SqlAlchemySession(URL, schema_cache_dir=cache_dir) as session:
+                wrapper = city.CityWrapper(session=session)
+                wrapper.add(c)
+                session.commit()
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            path, = os.listdir(cache_dir)
+            with open(os.path.join(cache_dir, path)) as f:
+                tables = [t["name"] for t in json.load(f)["tables"]]
+            self.assertIn(data_tbl("XSD_integer"), tables)
+
+            with SqlAlchemySession(URL, schema_cache_dir=cache_dir) as session:
+                self.assertIn(data_tbl("XSD_integer"),
+                              session._metadata.tables)
+                wrapper = city.CityWrapper(session=session)
+                p1w = wrapper.get(c.uid).get(p1.uid)
+                self.assertEqual(p1w.name, "Peter")
+                self.assertEqual(p1w.age, 42)
+
+            # the schema changes --> the cache is not used
+            engine = sqlalchemy.create_engine(URL)
+            with engine.begin() as conn:
+                conn.execute("CREATE TABLE new_table (x INTEGER);")
+            with SqlAlchemySession(URL, schema_cache_dir=cache_dir) as session:
+                self.assertNotIn(data_tbl("XSD_integer"),
+                                 session._metadata.tables)
+                wrapper = city.CityWrapper(session=session)
+                self.assertEqual(wrapper.get(c.uid).name, "Freiburg")
+            with SqlAlchemySession(URL, schema_cache_dir=cache_dir) as session:
+                self.assertIn(data_tbl("XSD_string"),
+                              session._metadata.tables)
+
+            # the type of a column changes --> the cache is not used
+            migrate_uid_storage(URL, binary=True)
+            with SqlAlchemySession(URL, schema_cache_dir=cache_dir) as session:
+                wrapper = city.CityWrapper(session=session)
+                self.assertEqual(wrapper.get(c.uid).name, "Freiburg")
+            with SqlAlchemySession(URL, schema_cache_dir=cache_dir) as session:
+                self.assertIsInstance(
+                    session._metadata.tables[CUDS_TABLE].c.uid.type,
+                    BinaryUid)
+                wrapper = city.CityWrapper(session=session)
+                self.assertEqual(wrapper.get(c.uid).name, "Freiburg")
+
+    def test_engine_registry(self):
+        """Test that sessions with the same options share an engine."""
+        with SqlAlchemySession(URL) as session1:
+            with SqlAlchemySession(URL) as session2:
+                self.assertIs(session1._engine, session2._engine)
+                self.assertIsNot(session1._connection, session2._connection)
+            with SqlAlchemySession(URL, pool_pre_ping=True) as session3:
+                self.assertIsNot(session1._engine, session3._engine)
+            wrapper = city.CityWrapper(session=session1)
+            wrapper.add(city.City(name="Freiburg"))
+            session1.commit()
+        self.assertTrue(session1._connection.closed)
+        self.assertIn(session1._engine, engines._engines.values())
+        session1.close()
+        with SqlAlchemySession(URL) as session6:
+            self.assertIs(session1._engine, session6._engine)
+
+        with mock.patch.object(engines, "MAX_IDLE_ENGINES", 0):
+            with SqlAlchemySession(URL) as session7:
+                pass
+        self.assertNotIn(session7._engine, engines._engines.values())
+
+        with SqlAlchemySession("sqlite://") as session4:
+            wrapper = city.CityWrapper(session=session4)
+            wrapper.add(city.City(name="Freiburg"))
+            session4.commit()
+        with SqlAlchemySession("sqlite://") as session5:
+            self.assertIsNot(session4._engine, session5._engine)
+            wrapper = city.CityWrapper(session=session5)
+            self.assertEqual(wrapper.get(), [])
+
+    def test_stream_results(self):
+        """Test loading with streamed results."""
+        c = city.City(name="Freiburg")
+        citizens = [city.Citizen(name="Citizen %s" % i) for i in range(10)]
+        c.add(*citizens, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        with SqlAlchemySession(URL, stream_results=True,
+                               stream_chunk_size=3) as session:
+            wrapper = city.CityWrapper(session=session)
+            r = session.load_by_oclass(city.Citizen)
+            self.assertEqual(set(r), set(citizens))
+            self.assertEqual(
+                {p.name for p in wrapper.get(c.uid).get(oclass=city.Citizen)},
+                {"Citizen %s" % i for i in range(10)}
+            )
+
+    def test_stats(self):
+        """Test collecting statistics about the executed statements."""
+        c = city.City(name="Freiburg")
+        p1 = city.Citizen(name="Peter")
+        p2 = city.Citizen(name="Anna")
+        c.add(p1, p2, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            self.assertRaises(RuntimeError, session.stats)
+
+        with SqlAlchemySession(URL, collect_stats=True,
+                               slow_query_threshold=0,
+                               slow_query_log_size=5) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.reset_stats()
+            session.commit()
+            stats = session.stats()
+            self.assertGreater(stats["statements"], 0)
+            self.assertEqual(
+                stats["statements"],
+                sum(x["statements"] for x in stats["operations"].values())
+            )
+            self.assertGreater(stats["operations"]["insert"]["rows"], 0)
+            self.assertGreater(stats["operations"]["select"]["statements"],
+                               0)
+            self.assertGreater(
+                stats["tables"][RELATIONSHIP_TABLE]["statements"], 0)
+            self.assertGreaterEqual(
+                stats["tables"][RELATIONSHIP_TABLE]["rows"], 2 * 2 + 2)
+            self.assertEqual(len(stats["slow_queries"]), 5)
+
+            session.reset_stats()
+            stats = session.stats()
+            self.assertEqual(stats["statements"], 0)
+            self.assertEqual(stats["slow_queries"], [])
+
+            # a failing statement does not disturb the next timing
+            with mock.patch("osp.wrappers.sqlalchemy.instrumentation."
+                            "time.perf_counter",
+                            side_effect=[0.0, 10.0, 12.0]):
+                self.assertRaises(sqlalchemy.exc.DBAPIError,
+                                  session._connection.execute,
+                                  "SELECT * FROM osp_missing_table")
+                session._connection.execute("SELECT 1")
+            stats = session.stats()
+            self.assertEqual(stats["statements"], 1)
+            self.assertEqual(stats["time"], 2.0)
+            self.assertNotIn("osp_query_start", session._connection.info)
+
+    def test_index_plan(self):
+        """Test creating the indexes of the index plan."""
+        with SqlAlchemySession(URL, create_planned_indexes=True) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(city.City(name="Freiburg"))
+            session.commit()
+            self.assertEqual(session.missing_indexes(), dict())
+            indexes = sqlalchemy.inspect(session._connection).get_indexes(
+                data_tbl("XSD_integer"))
+            index = next(x for x in indexes if x["name"]
+                         == "uidx_%s_s_p_o" % data_tbl("XSD_integer"))
+            self.assertEqual(index["column_names"], ["s", "p", "o"])
+            self.assertTrue(index["unique"])
+
+        # database created without the index plan
+        engine = sqlalchemy.create_engine(URL)
+        with engine.begin() as conn:
+            conn.execute(
+                f'DROP INDEX "idx_{RELATIONSHIP_TABLE}_o_p";')
+            conn.execute(
+                f'DROP INDEX "idx_{data_tbl("VECTOR-INT-2")}_p_o";')
+        with SqlAlchemySession(URL) as session:
+            missing = {
+                RELATIONSHIP_TABLE: [f"idx_{RELATIONSHIP_TABLE}_o_p"],
+                data_tbl("VECTOR-INT-2"): [
+                    f"idx_{data_tbl('VECTOR-INT-2')}_p_o"]
+            }
+            self.assertEqual(session.missing_indexes(), missing)
+            self.assertEqual(session.create_missing_indexes(), missing)
+            self.assertEqual(session.missing_indexes(), dict())
+            wrapper = city.CityWrapper(session=session)
+            self.assertEqual(wrapper.get(oclass=city.City)[0].name,
+                             "Freiburg")
+
+        # new tables are created without the index plan by default
+        with engine.begin() as conn:
+            conn.execute(f'DROP TABLE "{data_tbl("XSD_integer")}";')
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            index = "uidx_%s_s_p_o" % data_tbl("XSD_integer")
+            self.assertIn(index,
+                          session.missing_indexes()[data_tbl("XSD_integer")])
+            session.create_missing_indexes()
+            self.assertEqual(session.missing_indexes(), dict())
+
+            # clearing the database keeps the indexes
+            session._clear_database()
+            self.assertEqual(session.missing_indexes(), dict())
+
+    def test_update_batched(self):
+        """Test that the updates of a commit are executed in batches."""
+        c = city.City(name="Freiburg")
+        citizens = [city.Citizen(name="Citizen %s" % i) for i in range(50)]
+        c.add(*citizens, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+            table = data_tbl("XSD_string")
+            name = session._get_entity_idx(
+                *session._split_namespace(city.name.iri)
+            )
+            statements = list()
+            sqlalchemy.event.listen(
+                session._connection, "before_cursor_execute",
+                lambda conn, cursor, stmt, *args: statements.append(stmt)
+            )
+            session._init_transaction()
+            for citizen in citizens:
+                s = session._get_cuds_idx(citizen.uid)
+                session._do_db_update(
+                    table, ["o"], ["New %s" % citizen.name],
+                    AndCondition(
+                        EqualsCondition(table, "s", s, rdflib.XSD.integer),
+                        EqualsCondition(table, "p", name, rdflib.XSD.integer)
+                    ),
+                    {"o": rdflib.XSD.string}
+                )
+            session._commit()
+
+        updates = [x for x in statements if x.startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            names = {x.name for x in
+                     wrapper.get(c.uid).get(oclass=city.Citizen)}
+            self.assertEqual(names, {"New Citizen %s" % i
+                                     for i in range(50)})
+
+    def test_delete_batched(self):
+        """Test that the deletes of a commit are set-based."""
+        c = city.City(name="Freiburg")
+        citizens = [city.Citizen(name="Citizen %s" % i, age=i)
+                    for i in range(50)]
+        c.add(*citizens, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            cw = wrapper.get(c.uid)
+            cw.remove(rel=city.hasInhabitant)
+            session.prune()
+            statements = list()
+            sqlalchemy.event.listen(
+                session._connection, "before_cursor_execute",
+                lambda conn, cursor, stmt, *args: statements.append(stmt)
+            )
+            session.commit()
+
+        deletes = [x for x in statements if x.startswith("DELETE")]
+        self.assertLess(len(deletes), 20)
+
+        engine = sqlalchemy.create_engine(URL)
+        with engine.connect() as conn:
+            metadata = sqlalchemy.MetaData(conn)
+            metadata.reflect(engine)
+            for table, count in [(RELATIONSHIP_TABLE, 2),
+                                 (data_tbl("XSD_integer"), 0),
+                                 (data_tbl("XSD_string"), 1)]:
+                stmt = sqlalchemy.select([sqlalchemy.func.count()]) \
+                    .select_from(metadata.tables[table])
+                self.assertEqual(conn.execute(stmt).scalar(), count)
+
+    def test_load_batched(self):
+        """Test that many CUDS objects are loaded with few queries."""
+        c = city.City(name="Freiburg")
+        citizens = [city.Citizen(name="Citizen %s" % i, age=i)
+                    for i in range(50)]
+        c.add(*citizens, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            statements = list()
+            sqlalchemy.event.listen(
+                session._connection, "before_cursor_execute",
+                lambda conn, cursor, stmt, *args: statements.append(stmt)
+            )
+            loaded = list(session.load(*[x.uid for x in citizens]))
+
+        self.assertEqual([x.uid for x in loaded], [x.uid for x in citizens])
+        self.assertEqual([x.age for x in loaded], list(range(50)))
+        self.assertEqual([x.name for x in loaded],
+                         ["Citizen %s" % i for i in range(50)])
+        selects = [x for x in statements if x.startswith("SELECT")]
+        self.assertLess(len(selects), 20)
+
+    def test_in_or_condition(self):
+        """Test selecting with IN and OR conditions."""
+        c = city.City(name="Freiburg")
+        p1 = city.Citizen(name="Peter")
+        p2 = city.Citizen(name="Anne")
+        p3 = city.Citizen(name="Georg")
+        c.add(p1, p2, p3, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+            def select(condition):
+                query = SqlQuery(CUDS_TABLE, ["uid"], {"uid": "UID"})
+                return {row[0] for row in
+                        session._do_db_select(where(query, condition))}
+
+            self.assertEqual(
+                select(InCondition(CUDS_TABLE, "uid", [p1.uid, p3.uid],
+                                   "UID")),
+                {p1.uid, p3.uid}
+            )
+            self.assertEqual(
+                select(InCondition(CUDS_TABLE, "uid", [p2.uid], "UID")),
+                {p2.uid}
+            )
+            self.assertEqual(
+                select(InCondition(CUDS_TABLE, "uid", [], "UID")), set()
+            )
+            self.assertEqual(
+                select(OrCondition(
+                    EqualsCondition(CUDS_TABLE, "uid", p1.uid, "UID"),
+                    InCondition(CUDS_TABLE, "uid", [p2.uid], "UID")
+                )),
+                {p1.uid, p2.uid}
+            )
+            self.assertGreater(session.statement_cache_info()["size"], 0)
+
+    def test_load_subtree(self):
+        """Test loading a containment tree with a recursive query."""
+        c = city.City(name="Freiburg")
+        for i in range(3):
+            n = c.add(city.Neighborhood(name="Neighborhood %s" % i))
+            for j in range(3):
+                s = n.add(city.Street(name="Street %s %s" % (i, j)))
+                s.add(city.Building(name="Building %s %s" % (i, j)))
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            self.assertIsNone(session.load_subtree(uuid.uuid4()))
+            cw = session.load_subtree(c.uid, max_depth=1)
+            self.assertEqual(cw.uid, c.uid)
+            self.assertEqual(
+                {x.name for x in session._registry.values()
+                 if x.is_a(city.Neighborhood)},
+                {"Neighborhood %s" % i for i in range(3)}
+            )
+            self.assertFalse(any(x.is_a(city.Street)
+                                 for x in session._registry.values()))
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            statements = list()
+            sqlalchemy.event.listen(
+                session._connection, "before_cursor_execute",
+                lambda conn, cursor, stmt, *args: statements.append(stmt)
+            )
+            cw = session.load_subtree(c.uid)
+            n_statements = len(statements)
+            buildings = {b.name for n in cw.get(oclass=city.Neighborhood)
+                         for s in n.get(oclass=city.Street)
+                         for b in s.get(oclass=city.Building)}
+            self.assertEqual(len(statements), n_statements)
+            self.assertLess(n_statements, 20)
+            self.assertEqual(buildings, {"Building %s %s" % (i, j)
+                                         for i in range(3)
+                                         for j in range(3)})
+
+    def test_prune_database(self):
+        """Test pruning the database with a recursive query."""
+        c = city.City(name="Freiburg")
+        citizens = [city.Citizen(name="Citizen %s" % i, age=i)
+                    for i in range(10)]
+        c.add(*citizens, rel=city.hasInhabitant)
+        n = c.add(city.Neighborhood(name="Zähringen"))
+        s = n.add(city.Street(name="Le street"))
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            cw = wrapper.add(c)
+            session.commit()
+            cw.remove(*[x.uid for x in citizens[:4]], n.uid)
+            session.commit()
+
+            deleted = session.prune_database()
+            self.assertEqual(deleted[CUDS_TABLE], 6)
+            self.assertEqual(deleted[TYPES_TABLE], 6)
+            self.assertEqual(deleted[data_tbl("XSD_integer")], 4)
+            self.assertEqual(deleted[data_tbl("XSD_string")], 6)
+            self.assertEqual(deleted[RELATIONSHIP_TABLE], 2)
+            self.assertEqual(session.prune_database()[CUDS_TABLE], 0)
+            self.assertEqual(set(session.load(citizens[0].uid)), {None})
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            cw = wrapper.get(c.uid)
+            self.assertEqual({x.name for x in cw.get()},
+                             {"Citizen %s" % i for i in range(4, 10)})
+            self.assertEqual(list(session.load(s.uid)), [None])
+
+    def test_clear_database_fast(self):
+        """Test that clearing drops the data tables and resets the ids."""
+        c = city.City(name="Freiburg", coordinates=[1, 2])
+        c.add(city.Citizen(name="Peter", age=12), rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+            statements = list()
+            sqlalchemy.event.listen(
+                session._connection, "before_cursor_execute",
+                lambda conn, cursor, stmt, *args: statements.append(stmt)
+            )
+            session._clear_database(vacuum=True)
+            self.assertFalse([x for x in statements
+                              if x.startswith("DELETE")
+                              and DATA_TABLE_PREFIX in x])
+            self.assertIn(data_tbl("XSD_string"), session._table_names)
+
+        check_db_cleared(self, DB)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(city.City(name="Paris"))
+            session.commit()
+            cuds = session._get_sqlalchemy_table(CUDS_TABLE)
+            stmt = sqlalchemy.select([sqlalchemy.func.min(cuds.c.cuds_idx)])
+            self.assertEqual(session._connection.execute(stmt).scalar(), 1)
+
+    def test_identifier_cache(self):
+        """Test the caches for cuds_idx and entity_idx."""
+        c = city.City(name="Freiburg")
+        c.add(city.Citizen(name="Peter"), rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        with SqlAlchemySession(URL, cuds_cache_size=2) as session:
+            wrapper = city.CityWrapper(session=session)
+            info = session.identifier_cache_info()
+            self.assertGreaterEqual(info["entities"]["size"], 5)
+            name = session._split_namespace(city.name.iri)
+            self.assertIn(name, session._entity_idx_cache)
+
+            for citizen in session.load_by_oclass(city.Citizen):
+                citizen.name = "Georg"
+            wrapper.get(c.uid).name = "Paris"
+            session.commit()
+            info = session.identifier_cache_info()
+            self.assertEqual(info["cuds"]["size"], 2)
+            self.assertGreater(info["cuds"]["hits"], 0)
+            self.assertGreater(info["entities"]["hits"], 0)
+
+            uid = uuid.uuid4()
+            session._init_transaction()
+            idx = session._get_cuds_idx(uid)
+            self.assertEqual(session._get_cuds_idx(uid), idx)
+            session._rollback_transaction()
+            self.assertNotIn(uid, session._cuds_idx_cache)
+            session._init_transaction()
+            idx = session._get_cuds_idx(uid)
+            session._commit()
+            self.assertEqual(session._cuds_idx_cache.get(uid), idx)
+            cuds = session._get_sqlalchemy_table(CUDS_TABLE)
+            stmt = sqlalchemy.select([cuds.c.cuds_idx]) \
+                .where(cuds.c.uid == str(uid))
+            self.assertEqual(session._connection.execute(stmt).scalar(), idx)
+
+    def test_identifier_cache_reset(self):
+        """Test that the identifier caches are cleared on resets."""
+        c = city.City(name="Freiburg")
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+            def fill():
+                session._get_cuds_idx(c.uid)
+                session._get_entity_idx(
+                    *session._split_namespace(city.name.iri)
+                )
+                self.assertIn(c.uid, session._cuds_idx_cache)
+                self.assertGreater(len(session._entity_idx_cache), 0)
+
+            def check_cleared():
+                self.assertNotIn(c.uid, session._cuds_idx_cache)
+                self.assertEqual(len(session._entity_idx_cache), 0)
+
+            fill()
+            session.prune_database()
+            check_cleared()
+
+            fill()
+            session._init_transaction()
+            session._rollback_transaction()
+            check_cleared()
+
+            fill()
+            session._clear_database()
+            self.assertNotIn(c.uid, session._cuds_idx_cache)
+
+    def test_identifier_cache_failed_commit(self):
+        """Test that a failed commit removes the cached cuds_idx."""
+        p = city.Citizen(name="Peter")
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(p)
+            flush = session._flush_writes
+
+            def failing_flush(table_names=None):
+                if table_names is None:
+                    raise sqlalchemy.exc.OperationalError(
+                        "INSERT", None, Exception("failed")
+                    )
+                flush(table_names)
+
+            with mock.patch.object(session, "_flush_writes", failing_flush):
+                self.assertRaises(sqlalchemy.exc.OperationalError,
+                                  session.commit)
+            self.assertNotIn(p.uid, session._cuds_idx_cache)
+            self.assertEqual(session._uncommitted_idx, [])
+
+    def test_binary_uids(self):
+        """Test storing the uids in binary form."""
+        c = city.City(name="Freiburg")
+        p1 = city.Citizen(name="Peter")
+        c.add(p1, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL, binary_uids=True) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        def uid_type():
+            engine = sqlalchemy.create_engine(URL)
+            with engine.connect() as conn:
+                return conn.execute(
+                    "SELECT udt_name FROM information_schema.columns "
+                    "WHERE table_name = '%s' AND column_name = 'uid';"
+                    % CUDS_TABLE
+                ).scalar()
+
+        self.assertEqual(uid_type(), "uuid")
+
+        def check_loadable(**kwargs):
+            with SqlAlchemySession(URL, **kwargs) as session:
+                wrapper = city.CityWrapper(session=session)
+                c2 = wrapper.get(c.uid)
+                self.assertEqual(c2.name, "Freiburg")
+                self.assertEqual(c2.get(p1.uid).name, "Peter")
+                self.assertEqual(
+                    session.load_subtree(c.uid).get(p1.uid).name, "Peter"
+                )
+                p2 = city.Citizen(name="Georg")
+                c2.add(p2, rel=city.hasInhabitant)
+                session.commit()
+                c2.remove(p2.uid)
+                session.commit()
+
+        check_loadable()
+        check_loadable(binary_uids=True)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with SqlAlchemySession(URL, schema_cache_dir=cache_dir) as s:
+                city.CityWrapper(session=s).get(c.uid)
+            path = get_schema_cache_path(cache_dir, URL)
+            self.assertTrue(os.path.exists(path))
+            migrate_uid_storage(URL, binary=False, schema_cache_dir=cache_dir)
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(uid_type(), "varchar")
+        check_loadable()
+
+        migrate_uid_storage(URL, binary=True)
+        self.assertEqual(uid_type(), "uuid")
+        check_loadable()
+
+    def test_packed_vectors(self):
+        """Test storing vectors in a single column."""
+        c = city.City(name="Freiburg", coordinates=[1, 2])
+
+        with SqlAlchemySession(URL, packed_vectors=True) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        def check_storage():
+            engine = sqlalchemy.create_engine(URL)
+            with engine.connect() as conn:
+                columns = conn.execute(
+                    "SELECT column_name, udt_name "
+                    "FROM information_schema.columns "
+                    "WHERE table_name = '%s' ORDER BY ordinal_position;"
+                    % data_tbl("VECTOR-INT-2")
+                ).fetchall()
+                self.assertEqual([tuple(x) for x in columns],
+                                 [("s", "int4"), ("p", "int4"),
+                                  ("o", "_int8")])
+                return [tuple(x) for x in conn.execute(
+                    'SELECT o FROM "%s";' % data_tbl("VECTOR-INT-2")
+                )]
+
+        self.assertEqual(check_storage(), [([1, 2],)])
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            c2 = wrapper.get(c.uid)
+            self.assertIsInstance(c2.coordinates, np.ndarray)
+            np.testing.assert_array_equal(c2.coordinates, [1, 2])
+            c2.coordinates = [3, 4]
+            session.commit()
+            triples = list(session._triples((None, city.coordinates.iri,
+                                             rdflib.Literal(
+                                                 np.array([3, 4]),
+                                                 datatype=city.coordinates
+                                                 .datatype))))
+            self.assertEqual(len(triples), 1)
+            session._clear_database()
+        self.assertEqual(check_storage(), [])
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+        with SqlAlchemySession(URL, packed_vectors=True) as session:
+            wrapper = city.CityWrapper(session=session)
+            np.testing.assert_array_equal(wrapper.get(c.uid).coordinates,
+                                          [1, 2])
+        self.assertEqual(check_storage(), [([1, 2],)])
+
+    def test_update_typed_columns(self):
+        """Test batched updates of packed vectors and binary uids."""
+        cities = [city.City(name="City %s" % i, coordinates=[i, i])
+                  for i in range(3)]
+        new_uid = uuid.uuid4()
+
+        with SqlAlchemySession(URL, packed_vectors=True,
+                               binary_uids=True) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(*cities)
+            session.commit()
+
+            table = data_tbl("VECTOR-INT-2")
+            coordinates = session._get_entity_idx(
+                *session._split_namespace(city.coordinates.iri)
+            )
+            session._init_transaction()
+            for i, c in enumerate(cities):
+                s = session._get_cuds_idx(c.uid)
+                session._do_db_update(
+                    table, ["o"], [np.array([10 + i, 20 + i])],
+                    AndCondition(
+                        EqualsCondition(table, "s", s, rdflib.XSD.integer),
+                        EqualsCondition(table, "p", coordinates,
+                                        rdflib.XSD.integer)
+                    ),
+                    {"o": city.coordinates.datatype}
+                )
+            session._do_db_update(
+                CUDS_TABLE, ["uid"], [new_uid],
+                EqualsCondition(CUDS_TABLE, "cuds_idx",
+                                session._get_cuds_idx(cities[0].uid),
+                                rdflib.XSD.integer),
+                {"uid": "UID"}
+            )
+            session._commit()
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            self.assertEqual(wrapper.get(new_uid).name, "City 0")
+            for i, c in enumerate(cities[1:], 1):
+                np.testing.assert_array_equal(
+                    wrapper.get(c.uid).coordinates, [10 + i, 20 + i]
+                )
+
+    def test_interleaved_updates(self):
+        """Test that buffered updates keep their order."""
+        citizens = [city.Citizen(name="A"), city.Citizen(name="A")]
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(*citizens, rel=city.hasInhabitant)
+            session.commit()
+
+            table = data_tbl("XSD_string")
+            data = session._get_sqlalchemy_table(table)
+            s1, s2 = [session._get_cuds_idx(c.uid) for c in citizens]
+
+            def s_is(s):
+                return EqualsCondition(table, "s", s, rdflib.XSD.integer)
+
+            def o_is(o):
+                return EqualsCondition(table, "o", o, rdflib.XSD.string)
+
+            def update(value, condition):
+                session._do_db_update(table, ["o"], [value], condition,
+                                      {"o": rdflib.XSD.string})
+
+            def names():
+                return [session._connection.execute(
+                    sqlalchemy.select([data.c.o]).where(data.c.s == s)
+                ).scalar() for s in (s1, s2)]
+
+            session._init_transaction()
+            update("B", AndCondition(s_is(s1), o_is("A")))
+            update("C", s_is(s1))
+            update("D", AndCondition(s_is(s1), o_is("C")))
+            update("E", AndCondition(s_is(s2), o_is("A")))
+            update("F", AndCondition(s_is(s2), o_is("E")))
+            session._commit()
+            self.assertEqual(names(), ["D", "F"])
+
+            session._init_transaction()
+            update("X", s_is(s1))
+            update("Y", InCondition(table, "s", [s1, s2],
+                                    rdflib.XSD.integer))
+            update("Z", s_is(s2))
+            session._commit()
+            self.assertEqual(names(), ["Y", "Z"])
+
+    def test_load_attribute_arrays(self):
+        """Test loading the values of attributes as numpy arrays."""
+        c = city.City(name="Freiburg", coordinates=[1, 2])
+        citizens = [city.Citizen(name="Citizen %s" % i, age=i)
+                    for i in range(10)]
+        c.add(*citizens, rel=city.hasInhabitant)
+
+        for kwargs in [{}, {"packed_vectors": True}]:
+            with SqlAlchemySession(URL, **kwargs) as session:
+                wrapper = city.CityWrapper(session=session)
+                c2 = city.City(name="Paris", coordinates=[3, 4])
+                wrapper.add(c, c2)
+                session.commit()
+
+                arrays = session.load_attribute_arrays(
+                    city.Citizen, [city.age, city.name], chunk_size=3
+                )
+                self.assertEqual(set(arrays), {"uid", "age", "name"})
+                self.assertEqual(list(arrays["uid"]),
+                                 [str(x.uid) for x in citizens])
+                self.assertEqual(arrays["age"].dtype, np.dtype("int"))
+                np.testing.assert_array_equal(arrays["age"], range(10))
+                self.assertEqual(list(arrays["name"]),
+                                 ["Citizen %s" % i for i in range(10)])
+                self.assertFalse(np.ma.is_masked(arrays["age"]))
+
+                arrays = session.load_attribute_arrays(
+                    city.PopulatedPlace, [city.coordinates, city.age]
+                )
+                coordinates = dict(zip(arrays["uid"],
+                                       arrays["coordinates"].tolist()))
+                self.assertEqual(coordinates, {str(c.uid): [1, 2],
+                                               str(c2.uid): [3, 4]})
+                self.assertTrue(arrays["age"].mask.all())
+
+                arrays = session.load_attribute_arrays(
+                    city.Neighborhood, [city.coordinates]
+                )
+                self.assertEqual(arrays["uid"].shape, (0,))
+                self.assertEqual(arrays["coordinates"].shape, (0, 2))
+                session._clear_database()
+
+    def test_comparison_conditions(self):
+        """Test selecting with comparison, range, LIKE and IS NULL."""
+        c = city.City(name="Freiburg")
+        citizens = [city.Citizen(name="Citizen %s" % i, age=i * 10)
+                    for i in range(10)]
+        c.add(*citizens, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+            table = data_tbl("XSD_integer")
+
+            def select(condition):
+                query = SqlQuery(table, ["o"], {"o": rdflib.XSD.integer})
+                return sorted(row[0] for row in
+                              session._do_db_select(where(query, condition)))
+
+            integer = rdflib.XSD.integer
+            self.assertEqual(
+                select(ComparisonCondition(table, "o", ">", 60, integer)),
+                [70, 80, 90]
+            )
+            self.assertEqual(
+                select(ComparisonCondition(table, "o", "<=", 10, integer)),
+                [0, 10]
+            )
+            self.assertEqual(
+                select(RangeCondition(table, "o", 20, 40, integer)),
+                [20, 30, 40]
+            )
+            self.assertEqual(select(IsNullCondition(table, "o", integer)),
+                             [])
+            equals_null = EqualsCondition(table, "o", 0, integer)
+            equals_null.value = None
+            self.assertEqual(select(equals_null), [])
+            self.assertEqual(session._get_condition_shape(equals_null),
+                             (("null", table, "o"), []))
+            params = list()
+            self.assertIn("IS NULL", str(session._get_sqlalchemy_condition(
+                equals_null, params=params
+            )))
+            self.assertEqual(params, [])
+            self.assertRaises(ValueError, ComparisonCondition, table, "o",
+                              "~", 1, integer)
+            self.assertNotEqual(
+                ComparisonCondition(table, "o", "<", 1, integer),
+                ComparisonCondition(table, "o", ">", 1, integer)
+            )
+
+            index = {x.uid: i for i, x in enumerate(citizens)}
+
+            def uids(**predicates):
+                return [index[uid] for uid in
+                        session.search_uids(city.Citizen, **predicates)]
+
+            self.assertEqual(uids(age=(">", 60)), [7, 8, 9])
+            self.assertEqual(uids(age=("between", 20, 40),
+                                  name=("!=", "Citizen 3")), [2, 4])
+            self.assertEqual(uids(name=("like", "Citizen 1%")), [1])
+            self.assertEqual(uids(age=("in", [10, 90])), [1, 9])
+            self.assertEqual(uids(age=50), [5])
+            self.assertEqual(uids(age=None), [])
+            self.assertEqual(uids(name="Freiburg"), [])
+            self.assertEqual(
+                [x.name for x in session.search(city.City,
+                                                name="Freiburg")],
+                ["Freiburg"]
+            )
+            self.assertRaises(ValueError, session.search_uids,
+                              city.Citizen, foo=1)
+            self.assertRaises(ValueError, session.search_uids,
+                              city.Citizen, age=("~", 1))
+            self.assertRaises(ValueError, session.search_uids,
+                              city.City, coordinates=[1, 2])
+
+            # a missing value and a duplicate row
+            data = session._get_sqlalchemy_table(table)
+            session._connection.execute(data.delete().where(data.c.o == 0))
+            session._connection.execute(data.insert().from_select(
+                ["s", "p", "o"],
+                sqlalchemy.select([data.c.s, data.c.p, data.c.o])
+                .where(data.c.o == 50)
+            ))
+            self.assertEqual(uids(age=None), [0])
+            self.assertEqual(uids(age=("==", None)), [0])
+            self.assertEqual(uids(name=("==", None)), [])
+            self.assertEqual(uids(age=50), [5])
+            self.assertEqual(uids(age=(">=", 50)), [5, 6, 7, 8, 9])
+
+    def test_aggregation(self):
+        """Test the aggregation queries."""
+        c = city.City(name="Freiburg")
+        citizens = [city.Citizen(name="Citizen %s" % i, age=i * 10)
+                    for i in range(10)]
+        c.add(*citizens, rel=city.hasInhabitant)
+        citizens[0].add(citizens[1], citizens[2], rel=city.hasChild)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            registry_size = len(session._registry)
+            self.assertEqual(session.count_by_oclass(), {
+                city.Citizen: 10, city.City: 1, city.CityWrapper: 1
+            })
+            self.assertEqual(session.relationship_fanout(city.hasInhabitant),
+                             {10: 1})
+            self.assertEqual(
+                session.relationship_fanout(city.hasChild, city.Citizen),
+                {0: 9, 2: 1}
+            )
+            self.assertEqual(
+                sum(session.relationship_fanout().values()), 12
+            )
+            self.assertEqual(
+                session.attribute_statistics(city.Citizen, city.age),
+                {"count": 10, "min": 0, "max": 90, "avg": 45.0}
+            )
+            self.assertEqual(
+                session.attribute_statistics(city.City, city.age),
+                {"count": 0, "min": None, "max": None, "avg": None}
+            )
+            self.assertRaises(ValueError, session.attribute_statistics,
+                              city.Citizen, city.name)
+            self.assertEqual(len(session._registry), registry_size)
+
+    def test_iter_by_oclass(self):
+        """Test iterating over the CUDS objects of an oclass."""
+        c = city.City(name="Freiburg")
+        citizens = [city.Citizen(name="Citizen %s" % i, age=i)
+                    for i in range(25)]
+        c.add(*citizens, rel=city.hasInhabitant)
+
+        with SqlAlchemySession(URL) as session:
+            self.assertRaises(RuntimeError, next,
+                              session.iter_by_oclass(city.Citizen))
+            wrapper = city.CityWrapper(session=session)
+            wrapper.add(c)
+            session.commit()
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            self.assertEqual(
+                [x.age for x in session.iter_by_oclass(city.Citizen,
+                                                       page_size=10)],
+                list(range(25))
+            )
+            self.assertEqual(
+                [x.uid for x in session.iter_by_oclass(city.City)], [c.uid]
+            )
+            self.assertEqual(list(session.iter_by_oclass(city.Building)), [])
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            registry_size = len(session._registry)
+            iterator = session.iter_by_oclass(city.Citizen, page_size=10,
+                                              evict=True)
+            first = next(iterator)
+            first.age = 100
+            sizes = [len(session._registry) for _ in iterator]
+            self.assertEqual(len(sizes), 24)
+            self.assertLessEqual(max(sizes), registry_size + 11)
+            self.assertEqual(len(session._registry), registry_size + 1)
+            self.assertIn(first.uid, session._registry)
+            session.commit()
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            self.assertEqual(session.search_uids(city.Citizen, age=100),
+                             [first.uid])
+
+    def test_bulk_add(self):
+        """Test adding CUDS objects in committed chunks."""
+        citizens = list()
+        for i in range(25):
+            citizen = city.Citizen(name="Citizen %s" % i, age=i)
+            citizen.add(city.Person(name="Child %s" % i), rel=city.hasChild)
+            citizens.append(citizen)
+        failing = [city.Citizen(name="Failing %s" % i) for i in range(6)]
+        rolled_back = [city.Citizen(name="Rolled back %s" % i)
+                       for i in range(4)]
+
+        with SqlAlchemySession(URL) as session:
+            self.assertRaises(RuntimeError, session.bulk_add, citizens)
+            wrapper = city.CityWrapper(session=session)
+            registry_size = len(session._registry)
+            reports = list()
+            report = session.bulk_add(iter(citizens), rel=city.hasInhabitant,
+                                      chunk_size=10, progress=reports.append)
+            self.assertEqual([r["cuds_objects"] for r in reports],
+                             [10, 20, 25])
+            self.assertEqual(report["cuds_objects"], 25)
+            self.assertEqual(report["failed"], 0)
+            self.assertGreater(report["rows"], 25 * 4)
+            self.assertGreater(report["rows_per_second"], 0)
+            self.assertEqual(len(session._registry), registry_size)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            add = session._add
+
+            def failing_add(*triples):
+                add(*triples)
+                if any(str(t[2]) == "Failing 2" for t in triples):
+                    raise sqlalchemy.exc.DBAPIError("INSERT", None,
+                                                    Exception("failed"))
+
+            loaded = wrapper.get(citizens[0].uid)
+            with mock.patch.object(session, "_add", failing_add):
+                report = session.bulk_add(failing, chunk_size=2,
+                                          savepoints=True)
+            self.assertEqual(report["cuds_objects"], 4)
+            self.assertEqual(report["failed"], 2)
+            self.assertEqual(session._expired, {session.root})
+            self.assertIs(wrapper.get(citizens[0].uid), loaded)
+            self.assertEqual(len(wrapper.get(rel=city.hasInhabitant)), 25)
+
+            def interrupt(report):
+                raise KeyboardInterrupt()
+
+            self.assertRaises(KeyboardInterrupt, session.bulk_add,
+                              rolled_back, chunk_size=2, savepoints=True,
+                              progress=interrupt)
+
+        with SqlAlchemySession(URL) as session:
+            wrapper = city.CityWrapper(session=session)
+            inhabitants = wrapper.get(rel=city.hasInhabitant)
+            self.assertEqual(
+                sorted(x.age for x in inhabitants), list(range(25))
+            )
+            self.assertEqual(
+                {x.get(rel=city.hasChild)[0].name for x in inhabitants},
+                {"Child %s" % i for i in range(25)}
+            )
+            self.assertEqual(
+                sorted(x.name for x in wrapper.get(oclass=city.Citizen)
+                       if x.name.startswith("Failing")),
+                ["Failing 0", "Failing 1", "Failing 4", "Failing 5"]
+            )
+            self.assertFalse(any(x.name.startswith("Rolled back")
+                                 for x in wrapper.get(oclass=city.Citizen)))
+
 
 def check_state(test_case, c, p1, p2, db=DB):
     """Check if the postgres tables are in the correct state."""